@@ -1,7 +1,6 @@
 # --- Core Imports ---
 import asyncio
 import base64
-import io
 import os
 import sys
 import traceback
@@ -18,36 +17,53 @@ import platform
 import psutil
 import datetime
 import time
+import functools
+import itertools
+import collections
+import fnmatch
+import hashlib
+import re
+import mmap
+import contextlib
+import unicodedata
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 # --- PySide6 GUI Imports ---
 from PySide6.QtWidgets import (QApplication, QMainWindow, QTextEdit, QLabel,
                                QVBoxLayout, QWidget, QLineEdit, QHBoxLayout,
                                QSizePolicy, QPushButton)
-from PySide6.QtCore import QObject, Signal, Slot, Qt, QTimer
+from PySide6.QtCore import QObject, Signal, Slot, Qt, QTimer, QEvent
 from PySide6.QtGui import (QImage, QPixmap, QFont, QFontDatabase, QTextCursor, 
-                           QPainter, QPen, QVector3D, QMatrix4x4, QColor, QBrush)
+                           QPainter, QPen, QColor, QPolygonF)
 from PySide6.QtOpenGLWidgets import QOpenGLWidget
+import shiboken6
 
 # --- Media and AI Imports ---
 import cv2
 import pyaudio
-import PIL.Image
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
-from PIL import ImageGrab
 import numpy as np
 
+# Tool process-pool workers re-import this module under spawn/forkserver (as __mp_main__
+# when it is the entry point); they only need the search helpers, so they skip the key
+# checks and audio device setup below.
+IS_WORKER_PROCESS = __name__ == "__mp_main__" or multiprocessing.current_process().name != "MainProcess"
+
 # --- Load Environment Variables ---
-load_dotenv()
+if not IS_WORKER_PROCESS: load_dotenv()
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not ELEVENLABS_API_KEY:
+if not IS_WORKER_PROCESS and not ELEVENLABS_API_KEY:
     sys.exit("Error: ELEVENLABS_API_KEY not found. Please check your .env file.")
-if not GEMINI_API_KEY:
+if not IS_WORKER_PROCESS and not GEMINI_API_KEY:
     sys.exit("Error: GEMINI_API_KEY not found. Please set it in your .env file.")
 
 # --- Configuration ---
+ADA_DATA_DIR = os.path.join(os.path.expanduser("~"), ".ada")  # Indexes, caches and transcripts; never watched as user files
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 SEND_SAMPLE_RATE = 16000
@@ -58,62 +74,263 @@ VOICE_ID = 'pFZP5JQG7iQjIQuC4Bku'
 DEFAULT_MODE = "none"  # Options: "camera", "screen", "none"
 MAX_OUTPUT_TOKENS = 100
 
+# --- Avatar Animation ---
+ANIMATION_ACTIVE_FPS = 33           # While speaking
+ANIMATION_IDLE_FPS = 8              # While listening or idle
+ANIMATION_RAMP_SECONDS = 0.3        # Time to ramp from the idle to the active rate
+ANIMATION_FRAME_BUDGET_MS = 50      # A tick later than this skips its repaint so the GUI thread can catch up
+
+# --- Transcript ---
+TRANSCRIPT_FLUSH_MS = 16            # Streamed text is coalesced and drawn at most once per tick
+TRANSCRIPT_MAX_BLOCKS = 500         # Older turns beyond this are archived and removed from the view
+TRANSCRIPT_PAGE_TURNS = 20          # Archived turns paged back in per scroll to the top
+TRANSCRIPT_DIR = os.path.join(ADA_DATA_DIR, "transcripts")
+
+# --- Tool Execution ---
+TOOL_THREAD_WORKERS = 8      # Bounded pool for blocking I/O tools
+TOOL_PROCESS_WORKERS = min(4, os.cpu_count() or 1)  # Pool for parallel search scans (created on first use)
+TOOL_DEFAULT_TIMEOUT = 30    # Seconds before a tool call is abandoned
+TOOL_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Budget for cached file tool results
+FS_WATCH_ENABLED = True      # Invalidate caches on external edits (needs the optional watchdog package)
+FS_WATCH_MAX_DIRS = 20000    # Larger trees aren't watched; inotify allows only so many watches per user
+FS_WATCH_MAX_WATCHES = 32    # Separate watches (each an inotify instance and a thread) before giving up
+# Arguments holding paths; calls in one chunk that overlap on these are ordered if either writes
+TOOL_PATH_ARGS = ("folder_path", "file_path", "directory_path", "path", "old_path", "new_path", "directory")
+
+# --- System Monitoring ---
+METRICS_SAMPLE_INTERVAL = 1.0  # Seconds between background samples
+METRICS_HISTORY_SIZE = 600     # Samples kept in the ring buffer (10 minutes at 1 Hz)
+METRICS_DISK_PATH = '/'
+MEMORY_ALERT_PERCENT = 90
+DISK_ALERT_PERCENT = 95
+CPU_ALERT_PERCENT = 90
+
+# --- File Search ---
+SEARCH_INDEX_DIR = os.path.join(ADA_DATA_DIR, "search_index")
+SEARCH_INDEX_MAX_FILE_BYTES = 2 * 1024 * 1024  # Larger files are always scanned, never indexed
+SEARCH_INDEX_REFRESH_INTERVAL = 30             # Seconds between mtime/size sweeps
+SEARCH_INDEX_MERGE_THRESHOLD = 500             # Changed files kept in the delta before a merge
+SEARCH_INDEX_SYNC_AGE = 2.0                    # Unwatched trees are swept before a search once the last sweep is this old
+SEARCH_INDEX_MAX_FILES = 100000                # Larger trees (e.g. / or home) are scanned, never indexed
+SEARCH_INDEX_MAX_BYTES = 1024 * 1024 * 1024    # Same, for the total size of the indexable files
+SEARCH_IGNORED_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".mypy_cache", ".pytest_cache", ".tox"}
+SEARCH_MAX_LINES_PER_FILE = 5
+SEARCH_SNIPPET_CHARS = 200
+SEARCH_MAX_RESULTS = 100        # Files returned before the search stops early
+SEARCH_SCAN_BATCH_FILES = 32    # Files per task handed to a scan worker
+SEARCH_MMAP_MIN_BYTES = 64 * 1024  # Smaller files are read whole instead of mapped
+
+# --- File Reading ---
+READ_FILE_MAX_BYTES = 32 * 1024  # Response budget; longer reads are cut and return next_offset (and next_length)
+READ_FILE_DEFAULT_LINES = 50     # Lines returned by head/tail when no count is given
+
+# --- Text to Speech ---
+TTS_MODEL_ID = "eleven_turbo_v2_5"
+TTS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.8}
+TTS_INACTIVITY_TIMEOUT = 180    # Seconds ElevenLabs keeps an idle socket open (its maximum)
+TTS_KEEPALIVE_INTERVAL = 15     # Seconds between keepalive frames on the warm socket
+TTS_RECONNECT_BASE_DELAY = 0.5  # Backoff after a failed connect, doubled up to the max
+TTS_RECONNECT_MAX_DELAY = 30
+TTS_ACQUIRE_TIMEOUT = 10        # Seconds a turn waits for a socket before giving up
+TTS_FIRST_SEGMENT_MIN_CHARS = 12    # The first phrase of a reply goes out as soon as it is this long
+TTS_FIRST_SEGMENT_DEADLINE = 0.25   # ...or this many seconds after its first fragment arrived
+TTS_SEGMENT_MIN_CHARS = 60          # Later segments batch sentences up to at least this length
+TTS_SEGMENT_MAX_CHARS = 250
+TTS_SEGMENT_DEADLINE = 0.8
+TTS_CACHE_DIR = os.path.join(ADA_DATA_DIR, "tts_cache")
+TTS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+TTS_CACHE_MAX_CHARS = 80            # Only short stock phrases are worth caching
+
+# --- Audio Output ---
+PLAYBACK_BUFFER_SECONDS = 5.0       # Ring buffer capacity; the writer waits when it is full
+PLAYBACK_PREBUFFER_MS = 150         # Audio buffered before playback (re)starts after running dry
+PLAYBACK_FRAMES_PER_BUFFER = 480    # 20 ms callback period at 24 kHz
+PLAYBACK_LEVEL_DECAY = 0.85         # Per-period decay of the playback level, so it covers the echo's delay and tail
+
+# --- Barge-in ---
+BARGE_IN_ENABLED = True
+BARGE_IN_RMS_THRESHOLD = 1500       # int16 mic RMS that counts as the user talking over Ada
+BARGE_IN_MIN_CHUNKS = 2             # Consecutive loud mic chunks needed, so clicks and echo don't interrupt
+BARGE_IN_ECHO_RATIO = 1.0           # The mic must also beat this multiple of the playback level, so Ada's own voice doesn't count
+
+# --- Voice Activity Detection ---
+CLIENT_VAD_ENABLED = True           # Upload only speech and mark turns ourselves (disables the server's detection)
+VAD_RMS_THRESHOLD = 400             # Minimum int16 RMS for speech; raised automatically in noisy rooms
+VAD_NOISE_MULTIPLIER = 3.0          # Speech must also be this many times louder than the tracked noise floor
+VAD_ZCR_MAX = 0.3                   # Zero-crossing rate above which quiet audio is treated as hiss
+VAD_START_CHUNKS = 2                # Consecutive speech chunks needed to open a segment
+VAD_HANGOVER_CHUNKS = 8             # Chunks still sent after speech stops (~0.5 s at 16 kHz)
+VAD_PREROLL_CHUNKS = 4              # Chunks before the onset sent with it, so first syllables aren't clipped
+VAD_FLOOR_WINDOW_CHUNKS = 32        # Quietest chunk in this window (~2 s) is the floor estimate while a segment is open
+VAD_MAX_SEGMENT_CHUNKS = 470        # A segment is closed after ~30 s however loud the room stays
+
+# --- Live Session Uplink ---
+UPLINK_CONTROL_MAX = 16             # Text turns; producers wait when this lane is full
+UPLINK_AUDIO_MAX = 48               # ~3 s of mic chunks; the oldest audio is dropped beyond this
+UPLINK_VIDEO_MAX = 1                # Latest frame wins
+UPLINK_AUDIO_BATCH_MAX = 8          # Most mic chunks merged into one send (~0.5 s) when the link is backed up
+UPLINK_RATE_WINDOW = 5.0            # Seconds of sends behind the reported send rate
+
+# --- Video Capture ---
+CAPTURE_FPS = 30
+CAMERA_INDEX = 0
+CAMERA_OPEN_RETRY = (0.5, 10.0)     # First and longest wait, in seconds, between attempts to open a busy or missing camera
+FRAME_SLOT_BUFFERS = 3              # Front, back and one spare for a reader still holding the previous frame
+DISPLAY_POOL_BUFFERS = 3            # Pre-scaled preview frames that can be in flight to the GUI at once
+DEFAULT_SCREEN_REGION = "monitor:1"  # "all", "monitor:<n>", "window:<title>" or "rect:<left>,<top>,<width>,<height>"
+SCREEN_WINDOW_REFRESH = 1.0         # Seconds between window geometry lookups while following a window
+
+# --- Video Upload ---
+FRAME_DIFF_SIZE = (128, 72)         # Grayscale thumbnail compared against the last uploaded frame
+FRAME_DIFF_BLOCK = 8                # Thumbnail pixels per side of a comparison block
+FRAME_DIFF_THRESHOLDS = {"screen": 2.0, "camera": 8.0}  # Largest block mean difference (0-255) that still counts as unchanged
+FRAME_KEYFRAME_INTERVAL = 30.0      # Seconds after which a frame is uploaded even if nothing changed
+FRAME_MAX_DIMENSION = 1024          # Longest side of an uploaded frame
+FRAME_JPEG_QUALITY = 75
+VIDEO_FPS_RANGE = (0.2, 2.0)        # Bounds the upload controller adapts within
+VIDEO_DIMENSION_RANGE = (512, 1536)
+VIDEO_QUALITY_RANGE = (50, 85)
+VIDEO_SEND_LATENCY_TARGET = 0.25    # Seconds a frame send may take before the link counts as congested
+VIDEO_AUDIO_BACKLOG_LIMIT = 4       # Queued mic chunks that also count as congestion
+
 # --- Initialize Clients ---
-pya = pyaudio.PyAudio()
+pya = None if IS_WORKER_PROCESS else pyaudio.PyAudio()
 
 # ==============================================================================
 # AI Animation Widget
 # ==============================================================================
 class AIAnimationWidget(QWidget):
+    """
+    Rotating point sphere that pulses while Ada speaks. Frames are scheduled
+    by state: none while the widget is hidden or its window is minimised or
+    inactive, a low rate when idle, ramping to the full rate while speaking.
+    Motion is driven by elapsed time, so it runs at the same speed at any rate.
+    """
+    SIZE_BUCKETS = 8  # Points are drawn in this many depth layers, one pen each
+    DEGREES_PER_SECOND_Y = 26.7
+    DEGREES_PER_SECOND_X = 6.7
+    PULSE_RADIANS_PER_SECOND = 6.7
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.angle_y = 0
         self.angle_x = 0
         self.sphere_points = self.create_sphere_points()
+        self.pens = {speaking: self.bucket_pens(speaking) for speaking in (False, True)}
+        self.bucket_polygons = [QPolygonF() for _ in range(self.SIZE_BUCKETS)]
         self.is_speaking = False
         self.pulse_angle = 0
+        self.fps = ANIMATION_IDLE_FPS
+        self.last_tick = None
+        self.skipped_frames = 0
+        self.watched_window = None
 
         self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.update_animation)
-        self.timer.start(30) # Update about 33 times per second
 
     def start_speaking_animation(self):
         """Activates the speaking animation state."""
         self.is_speaking = True
+        self.reschedule()
 
     def stop_speaking_animation(self):
         """Deactivates the speaking animation state."""
         self.is_speaking = False
         self.pulse_angle = 0 # Reset for a clean start next time
+        self.reschedule()
         self.update() # Schedule a final repaint in the non-speaking state
 
+    def should_animate(self):
+        window = self.window()
+        return self.isVisible() and not window.isMinimized() and window.isActiveWindow()
+
+    def reschedule(self):
+        """Starts, stops or retimes the frame timer for the current state."""
+        if not self.should_animate():
+            self.timer.stop()
+            self.last_tick = None
+            return
+        if not self.is_speaking: self.fps = ANIMATION_IDLE_FPS
+        self.timer.setInterval(int(1000 / self.fps))
+        if not self.timer.isActive(): self.timer.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.watched_window is not self.window():
+            # Activation and minimise changes are only delivered to the top-level window
+            self.watched_window = self.window()
+            self.watched_window.installEventFilter(self)
+        self.reschedule()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.reschedule()
+
+    def eventFilter(self, obj, event):
+        if obj is self.watched_window and event.type() in (QEvent.Type.ActivationChange, QEvent.Type.WindowStateChange):
+            self.reschedule()
+        return super().eventFilter(obj, event)
+
     def create_sphere_points(self, radius=60, num_points_lat=20, num_points_lon=40):
-        """Creates a list of QVector3D points on the surface of a sphere."""
-        points = []
-        for i in range(num_points_lat + 1):
-            lat = math.pi * (-0.5 + i / num_points_lat)
-            y = radius * math.sin(lat)
-            xy_radius = radius * math.cos(lat)
-
-            for j in range(num_points_lon):
-                lon = 2 * math.pi * (j / num_points_lon)
-                x = xy_radius * math.cos(lon)
-                z = xy_radius * math.sin(lon)
-                points.append(QVector3D(x, y, z))
-        return points
+        """Creates an (N, 3) array of points on the surface of a sphere."""
+        lat = np.pi * (-0.5 + np.arange(num_points_lat + 1) / num_points_lat)
+        lon = 2 * np.pi * np.arange(num_points_lon) / num_points_lon
+        lat, lon = np.meshgrid(lat, lon, indexing="ij")
+        xy_radius = radius * np.cos(lat)
+        return np.stack([xy_radius * np.cos(lon), radius * np.sin(lat), xy_radius * np.sin(lon)], axis=-1).reshape(-1, 3)
+
+    def bucket_pens(self, speaking):
+        """Round-capped pens for each depth layer: back layers are smaller and fainter."""
+        pens = []
+        for bucket in range(self.SIZE_BUCKETS):
+            size = (bucket + 0.5) / self.SIZE_BUCKETS
+            color = QColor(170, 255, 255, int(50 + 205 * size)) if speaking else QColor(0, 255, 255, int(50 + 205 * size))
+            pens.append(QPen(color, 1 + size * 3, Qt.SolidLine, Qt.RoundCap))
+        return pens
 
     def update_animation(self):
-        self.angle_y += 0.8
-        self.angle_x += 0.2
+        now = time.monotonic()
+        elapsed = now - self.last_tick if self.last_tick is not None else 1.0 / self.fps
+        self.last_tick = now
+        behind = (elapsed - self.timer.interval() / 1000) * 1000 > ANIMATION_FRAME_BUDGET_MS
+        elapsed = min(elapsed, 0.25)  # Don't jump after a pause or a long stall
+        self.angle_y = (self.angle_y + self.DEGREES_PER_SECOND_Y * elapsed) % 360
+        self.angle_x = (self.angle_x + self.DEGREES_PER_SECOND_X * elapsed) % 360
         if self.is_speaking:
-            self.pulse_angle += 0.2
-            if self.pulse_angle > math.pi * 2:
-                self.pulse_angle -= math.pi * 2
-
-        if self.angle_y >= 360: self.angle_y = 0
-        if self.angle_x >= 360: self.angle_x = 0
+            self.pulse_angle = (self.pulse_angle + self.PULSE_RADIANS_PER_SECOND * elapsed) % (math.pi * 2)
+            if self.fps < ANIMATION_ACTIVE_FPS:
+                step = (ANIMATION_ACTIVE_FPS - ANIMATION_IDLE_FPS) * elapsed / ANIMATION_RAMP_SECONDS
+                self.fps = min(ANIMATION_ACTIVE_FPS, self.fps + step)
+                self.timer.setInterval(int(1000 / self.fps))
+
+        if behind:
+            self.skipped_frames += 1  # The GUI thread is behind; let it catch up before painting again
+            return
         self.update()
 
+    def project_points(self, pulse_factor):
+        """Rotates and projects every point in one pass. Returns screen x, y and a 0-1 depth size."""
+        ay, ax = math.radians(self.angle_y), math.radians(self.angle_x)
+        rotation_y = np.array([[math.cos(ay), 0, math.sin(ay)], [0, 1, 0], [-math.sin(ay), 0, math.cos(ay)]])
+        rotation_x = np.array([[1, 0, 0], [0, math.cos(ax), -math.sin(ax)], [0, math.sin(ax), math.cos(ax)]])
+        rotated = self.sphere_points @ (rotation_y @ rotation_x).T
+        z = rotated[:, 2]
+        scale = 200 / (200 + z) * pulse_factor
+        size = np.clip((z + 60) / 120, 0.0, 1.0)
+        # Offset to the dot's centre, matching the old top-left-anchored ellipses
+        offset = (1 + size * 3) / 2
+        return rotated[:, 0] * scale + offset, rotated[:, 1] * scale + offset, size
+
+    @staticmethod
+    def fill_polygon(polygon, xs, ys):
+        """Resizes polygon to len(xs) points and writes the coordinates straight into its QPointF array."""
+        polygon.resize(len(xs))
+        # A QPointF is two doubles, so the array is an (n, 2) float64 block
+        points = np.frombuffer(shiboken6.VoidPtr(polygon.data(), 16 * len(xs), True), np.float64).reshape(-1, 2)
+        points[:, 0], points[:, 1] = xs, ys
+        return polygon
+
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
@@ -128,294 +345,1892 @@ class AIAnimationWidget(QWidget):
             pulse = (1 + math.sin(self.pulse_angle)) / 2
             pulse_factor = 1.0 + (pulse * pulse_amplitude)
 
-        rotation_y = QMatrix4x4(); rotation_y.rotate(self.angle_y, 0, 1, 0)
-        rotation_x = QMatrix4x4(); rotation_x.rotate(self.angle_x, 1, 0, 0)
-        rotation = rotation_y * rotation_x
+        x, y, size = self.project_points(pulse_factor)
+        buckets = np.minimum((size * self.SIZE_BUCKETS).astype(np.intp), self.SIZE_BUCKETS - 1)
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(self.SIZE_BUCKETS + 1))
+        xs, ys = x[order], y[order]
+        # Back to front, one drawPoints call per depth layer, from reused polygons filled without QPointF objects
+        for bucket, pen in enumerate(self.pens[self.is_speaking]):
+            start, end = bounds[bucket], bounds[bucket + 1]
+            if start == end: continue
+            painter.setPen(pen)
+            painter.drawPoints(self.fill_polygon(self.bucket_polygons[bucket], xs[start:end], ys[start:end]))
 
-        projected_points = []
-        for point in self.sphere_points:
-            rotated_point = rotation.map(point)
-            
-            z_factor = 200 / (200 + rotated_point.z())
-            x = (rotated_point.x() * z_factor) * pulse_factor
-            y = (rotated_point.y() * z_factor) * pulse_factor
-            
-            size = (rotated_point.z() + 60) / 120
-            alpha = int(50 + 205 * size)
-            point_size = 1 + size * 3
-            projected_points.append((x, y, point_size, alpha))
+# ==============================================================================
+# FILE SEARCH
+# ==============================================================================
+def load_gitignore(directory):
+    """Parses directory/.gitignore into (base, pattern, dir_only, anchored) rules. Negations are not supported."""
+    rules = []
+    try:
+        with open(os.path.join(directory, ".gitignore"), 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith(("#", "!")): continue
+                dir_only = line.endswith("/")
+                pattern = line.rstrip("/")
+                rules.append((directory, pattern.lstrip("/"), dir_only, "/" in pattern))
+    except OSError:
+        pass
+    return rules
+
+def is_ignored(path, is_dir, rules):
+    for base, pattern, dir_only, anchored in rules:
+        if dir_only and not is_dir: continue
+        target = os.path.relpath(path, base).replace(os.sep, "/") if anchored else os.path.basename(path)
+        if fnmatch.fnmatch(target, pattern): return True
+    return False
+
+def is_searchable(root, path):
+    """Whether walk_files(root) reaches path, i.e. no ignored directory or .gitignore rule excludes it."""
+    rel_path = os.path.relpath(path, root)
+    if rel_path == ".": return True
+    if rel_path.startswith(os.pardir): return False
+    current, rules = root, load_gitignore(root)
+    for name in rel_path.split(os.sep):
+        current = os.path.join(current, name)
+        is_dir = os.path.isdir(current)
+        if os.path.islink(current) or name in SEARCH_IGNORED_DIRS or is_ignored(current, is_dir, rules): return False
+        if is_dir: rules = rules + load_gitignore(current)
+    return True
+
+def walk_files(directory):
+    """
+    Yields (path, stat) for every regular file under directory, skipping
+    SEARCH_IGNORED_DIRS and anything matched by a .gitignore on the way down.
+    """
+    stack = [(directory, load_gitignore(directory))]
+    while stack:
+        current, rules = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SEARCH_IGNORED_DIRS and not is_ignored(entry.path, True, rules):
+                                stack.append((entry.path, rules + load_gitignore(entry.path)))
+                        elif entry.is_file(follow_symlinks=False) and not is_ignored(entry.path, False, rules):
+                            yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
 
-        projected_points.sort(key=lambda p: p[2])
-        
-        for x, y, point_size, alpha in projected_points:
-            color = QColor(170, 255, 255, alpha) if self.is_speaking else QColor(0, 255, 255, alpha)
-            painter.setPen(Qt.NoPen)
-            painter.setBrush(QBrush(color))
-            painter.drawEllipse(int(x), int(y), int(point_size), int(point_size))
+def compile_search(search_term, regex=False):
+    """
+    Case-insensitive bytes matcher for a literal term or a regular expression.
+    MULTILINE makes ^ and $ anchor at every line, as they would in a line-based grep.
+    """
+    term = search_term.encode('utf-8')
+    return re.compile(term if regex else re.escape(term), re.IGNORECASE | re.MULTILINE)
+
+def count_newlines(buffer, start, end, chunk=1024 * 1024):
+    """Counts b'\\n' in buffer[start:end] through numpy views, one bounded chunk at a time."""
+    total = 0
+    while start < end:
+        n = min(chunk, end - start)
+        total += int(np.count_nonzero(np.frombuffer(buffer, dtype=np.uint8, count=n, offset=start) == 10))
+        start += n
+    return total
+
+def line_start_offset(buffer, line, chunk=1024 * 1024):
+    """Byte offset where 1-based line `line` starts, or len(buffer) if the file is shorter."""
+    remaining, start = line - 1, 0
+    while remaining > 0 and start < len(buffer):
+        n = min(chunk, len(buffer) - start)
+        newlines = np.flatnonzero(np.frombuffer(buffer, dtype=np.uint8, count=n, offset=start) == 10)
+        if len(newlines) >= remaining: return start + int(newlines[remaining - 1]) + 1
+        remaining -= len(newlines)
+        start += n
+    return len(buffer) if remaining > 0 else 0
+
+def tail_start_offset(buffer, lines):
+    """Byte offset where the last `lines` lines of buffer start."""
+    pos = len(buffer) - 1 if buffer[-1:] == b"\n" else len(buffer)
+    for _ in range(lines):
+        pos = buffer.rfind(b"\n", 0, pos)
+        if pos < 0: return 0
+    return pos + 1
+
+def scan_file(file_path, pattern, max_lines=SEARCH_MAX_LINES_PER_FILE):
+    """
+    Byte-level search of one file: binary files are skipped, large files are
+    mapped rather than read, and nothing is lowercased or decoded except the
+    snippet lines. pattern is a compiled case-insensitive bytes regex.
+    Returns {'file', 'matches', 'lines'} or None.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(8192)
+            if not head or b"\0" in head: return None
+            size = os.fstat(f.fileno()).st_size
+            if size < SEARCH_MMAP_MIN_BYTES:
+                buffer = head + f.read()
+            else:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                matches, lines, line_number, last_pos = 0, [], 1, 0
+                for match in pattern.finditer(buffer):
+                    matches += 1
+                    if len(lines) < max_lines:
+                        pos = match.start()
+                        line_number += count_newlines(buffer, last_pos, pos)
+                        last_pos = pos
+                        line_start = buffer.rfind(b"\n", 0, pos) + 1
+                        line_end = buffer.find(b"\n", pos)
+                        snippet = buffer[line_start:min(line_end if line_end >= 0 else len(buffer), line_start + SEARCH_SNIPPET_CHARS * 4)]
+                        if not lines or lines[-1]["line"] != line_number:
+                            lines.append({"line": line_number, "text": snippet.decode('utf-8', errors='ignore').strip()[:SEARCH_SNIPPET_CHARS]})
+            finally:
+                if isinstance(buffer, mmap.mmap): buffer.close()
+    except (OSError, ValueError):
+        return None
+    return {"file": file_path, "matches": matches, "lines": lines} if matches else None
+
+def scan_file_batch(file_paths, search_term, regex, max_lines=SEARCH_MAX_LINES_PER_FILE):
+    """Worker entry point: scans a batch of files and returns the hits."""
+    pattern = compile_search(search_term, regex)
+    return [result for result in (scan_file(path, pattern, max_lines) for path in file_paths) if result]
+
+def scan_tree(search_term, file_pattern="*", directory=".", regex=False, max_results=SEARCH_MAX_RESULTS, file_paths=None):
+    """
+    Streams search hits from file_paths, or a walk of directory, scanning them
+    inline. Stops once max_results is reached.
+    """
+    pattern = compile_search(search_term, regex)
+    candidates = file_paths if file_paths is not None else (path for path, _ in walk_files(directory))
+    found = 0
+    for path in candidates:
+        if not fnmatch.fnmatch(os.path.basename(path), file_pattern): continue
+        result = scan_file(path, pattern)
+        if result:
+            yield result
+            found += 1
+            if found >= max_results: return
+
+async def scan_tree_parallel(search_term, file_pattern, directory, regex, max_results, process_pool, walk_pool):
+    """
+    Searches an unindexed tree. The walk runs on walk_pool and files are handed
+    to process_pool in small batches with a bounded number in flight, so memory
+    stays proportional to the worker count and no thread sits blocked waiting
+    on the workers. Stops walking and cancels outstanding batches once
+    max_results is reached.
+    """
+    loop = asyncio.get_running_loop()
+    compile_search(search_term, regex)  # Raise re.error up front rather than inside every worker
+    candidates = (path for path, _ in walk_files(directory) if fnmatch.fnmatch(os.path.basename(path), file_pattern))
+    next_batch = lambda: list(itertools.islice(candidates, SEARCH_SCAN_BATCH_FILES))
+    max_in_flight = 2 * TOOL_PROCESS_WORKERS
+    results, in_flight, exhausted = [], set(), False
+    try:
+        while True:
+            while not exhausted and len(in_flight) < max_in_flight:
+                batch = await loop.run_in_executor(walk_pool, next_batch)
+                if not batch: exhausted = True; break
+                in_flight.add(asyncio.wrap_future(process_pool.submit(scan_file_batch, batch, search_term, regex)))
+            if not in_flight: return results
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    results.append(result)
+                    if len(results) >= max_results: return results
+    finally:
+        for future in in_flight: future.cancel()
+
+REGEX_ESCAPE_HEX_DIGITS = {"x": 2, "u": 4, "U": 8}
+
+def regex_escape_literal(pattern, i):
+    """
+    Decodes the value-carrying escape starting at pattern[i] == '\\' (\\xhh,
+    \\uXXXX, \\UXXXXXXXX, \\N{name}, octal). Returns (char, end), or (None, end)
+    for escapes that stand for a class, an anchor or a backreference.
+    """
+    kind, start = pattern[i + 1], i + 2
+    if kind in REGEX_ESCAPE_HEX_DIGITS:
+        end = start + REGEX_ESCAPE_HEX_DIGITS[kind]
+        try: return chr(int(pattern[start:end], 16)), end
+        except ValueError: return None, end
+    if kind == "N" and pattern.startswith("{", start):
+        end = pattern.find("}", start)
+        if end < 0: return None, len(pattern)
+        try: return unicodedata.lookup(pattern[start + 1:end]), end + 1
+        except KeyError: return None, end + 1
+    if kind.isdigit():
+        digits = re.match(r"[0-7]{3}|0[0-7]{0,2}|[0-9]{1,2}", pattern[i + 1:]).group()
+        octal = kind == "0" or len(digits) == 3
+        return (chr(int(digits, 8)) if octal else None), i + 1 + len(digits)
+    return None, start
+
+def regex_required_literals(pattern):
+    """
+    Literal runs that every match of a regular expression must contain. Only
+    top-level, unquantified characters count; alternation gives up entirely.
+    """
+    if "|" in pattern: return []
+    literals, current, depth, i = [], "", 0, 0
+    while i < len(pattern):
+        c, end = pattern[i], i + 1
+        if c == "\\" and end < len(pattern):
+            if pattern[end].isalnum():  # \d, \w, \b, backreferences, \x41...
+                c, end = regex_escape_literal(pattern, i)
+                if c is None:
+                    literals.append(current); current = ""; i = end; continue
+            else:
+                c, end = pattern[end], end + 1
+        elif c == "[":
+            close = pattern.find("]", i + (3 if pattern.startswith("[^", i) else 2))
+            literals.append(current); current = ""; i = len(pattern) if close < 0 else close + 1; continue
+        elif c in "()":
+            depth += 1 if c == "(" else -1
+            literals.append(current); current = ""; i = end; continue
+        elif c in ".^$*+?{}":
+            literals.append(current); current = ""
+            i = (pattern.find("}", i) + 1 or len(pattern)) if c == "{" else end; continue
+        if depth > 0:
+            i = end; continue
+        quantifier = pattern[end] if end < len(pattern) else ""
+        if quantifier in ("*", "?", "{"):  # The character may be absent
+            literals.append(current); current = ""
+        elif quantifier == "+":            # Present at least once, but the run ends here
+            literals.append(current + c); current = ""
+        else:
+            current += c
+        i = end
+    literals.append(current)
+    return [literal for literal in literals if len(literal) >= 3]
+
+def trigrams(data):
+    """Unique byte trigrams of data (already lowercased) as sorted uint32 values."""
+    if len(data) < 3: return np.empty(0, np.uint32)
+    b = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+
+class TrigramIndex:
+    """
+    Case-insensitive trigram index over the text files under one directory.
+    The bulk of the postings is a pair of sorted numpy arrays (trigram, file id)
+    persisted to disk; files changed since the last merge live in a small delta.
+    A background thread keeps it current with mtime/size sweeps. Trees past
+    SEARCH_INDEX_MAX_FILES or SEARCH_INDEX_MAX_BYTES are given up on, and
+    searches there fall back to scanning.
+    """
+    VERSION = 1
+
+    def __init__(self, root, index_dir=SEARCH_INDEX_DIR):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(index_dir, hashlib.sha1(self.root.encode()).hexdigest()[:16] + ".npz")
+        self.lock = threading.RLock()
+        self.paths = []          # file id -> path relative to root (None once removed)
+        self.stats = {}          # relative path -> [file id, mtime_ns, size]
+        self.large_files = set() # relative paths too big to index; always candidates
+        self.base_grams = np.empty(0, np.uint32)
+        self.base_ids = np.empty(0, np.uint32)
+        self.delta = {}          # file id -> trigrams of files changed since the last merge
+        self.stale = set()       # file ids whose base postings are out of date
+        self.ready = False
+        self.oversized = False
+        self.generation = 0      # Bumped whenever the indexed content changes
+        self.swept_at = 0.0      # time.monotonic() at the start of the last completed sweep
+        self._sweep_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._run, name="ada-search-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set(); self._wake.set()
+
+    def _run(self):
+        try:
+            self.load()
+            self.refresh()
+            self.ready = not self.oversized
+            while not self._stop_event.is_set():
+                self._wake.wait(SEARCH_INDEX_REFRESH_INTERVAL)
+                self._wake.clear()
+                if not self._stop_event.is_set(): self.refresh()
+        except Exception as e:
+            print(f">>> [ERROR] Search index for '{self.root}' failed: {e}")
+
+    def covers(self, path):
+        """Whether this index answers searches of path: it lies under the root and isn't excluded from the walk."""
+        return not self.oversized and paths_overlap(path, self.root) and len(path) >= len(self.root) and is_searchable(self.root, path)
+
+    def notify_changed(self, path):
+        """Re-indexes a file right away; anything else triggers an early sweep."""
+        path = os.path.abspath(path)
+        if self.oversized or not is_searchable(self.root, path): return
+        if os.path.isfile(path) and self.ready:
+            with self.lock:
+                self._update_file(os.path.relpath(path, self.root), os.stat(path))
+                self.generation += 1
+        else:
+            self._wake.set()
+
+    def load(self):
+        try:
+            with np.load(self.index_path) as data:
+                meta = json.loads(bytes(data["meta"]).decode())
+                if meta.get("version") != self.VERSION or meta.get("root") != self.root: return
+                with self.lock:
+                    self.paths, self.stats = meta["paths"], meta["stats"]
+                    self.large_files = set(meta["large_files"])
+                    self.base_grams, self.base_ids = data["grams"], data["ids"]
+        except (OSError, KeyError, ValueError):
+            pass
+
+    def save(self):
+        with self.lock:
+            meta = json.dumps({"version": self.VERSION, "root": self.root, "paths": self.paths,
+                               "stats": self.stats, "large_files": sorted(self.large_files)}).encode()
+            grams, ids = self.base_grams, self.base_ids
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp.npz"
+        np.savez(tmp_path, grams=grams, ids=ids, meta=np.frombuffer(meta, dtype=np.uint8))
+        os.replace(tmp_path, self.index_path)
+
+    def sync(self, max_age=SEARCH_INDEX_SYNC_AGE):
+        """Sweeps now unless the last sweep is recent; for trees no file watcher reports on."""
+        if time.monotonic() - self.swept_at > max_age: self.refresh()
+
+    def refresh(self):
+        """Sweeps the tree and re-indexes files whose mtime or size changed."""
+        with self._sweep_lock:
+            started = time.monotonic()
+            self._sweep()
+            self.swept_at = started
+
+    def _sweep(self):
+        files = list(itertools.islice(walk_files(self.root), SEARCH_INDEX_MAX_FILES + 1))
+        if len(files) > SEARCH_INDEX_MAX_FILES or sum(st.st_size for _, st in files if st.st_size <= SEARCH_INDEX_MAX_FILE_BYTES) > SEARCH_INDEX_MAX_BYTES:
+            self._give_up(); return
+        changed, seen = False, set()
+        for file_path, st in files:
+            rel_path = os.path.relpath(file_path, self.root)
+            seen.add(rel_path)
+            entry = self.stats.get(rel_path)
+            if entry is None or entry[1] != st.st_mtime_ns or entry[2] != st.st_size:
+                with self.lock: self._update_file(rel_path, st)
+                changed = True
+        with self.lock:
+            for rel_path in [p for p in self.stats if p not in seen]:
+                self._remove_file(rel_path); changed = True
+            if changed:
+                self.generation += 1
+                if len(self.delta) + len(self.stale) > SEARCH_INDEX_MERGE_THRESHOLD or not self.ready: self._merge()
+        # Only a fully merged index is persisted, so the saved stats always match the saved postings
+        if changed and not self.delta and not self.stale: self.save()
+
+    def _give_up(self):
+        """Drops the index of a tree too large to keep, including any copy on disk."""
+        print(f">>> [INFO] '{self.root}' is too large to index; searches there will scan it instead.")
+        with self.lock:
+            self.oversized, self.ready = True, False
+            self.paths, self.stats, self.large_files, self.delta, self.stale = [], {}, set(), {}, set()
+            self.base_grams, self.base_ids = np.empty(0, np.uint32), np.empty(0, np.uint32)
+        with contextlib.suppress(OSError): os.remove(self.index_path)
+        self.stop()
+
+    def _update_file(self, rel_path, st):
+        entry = self.stats.get(rel_path)
+        if entry is None:
+            entry = [len(self.paths), 0, 0]
+            self.paths.append(rel_path)
+            self.stats[rel_path] = entry
+        file_id = entry[0]
+        entry[1], entry[2] = st.st_mtime_ns, st.st_size
+        self.stale.add(file_id)
+        self.large_files.discard(rel_path)
+        if st.st_size > SEARCH_INDEX_MAX_FILE_BYTES:
+            self.large_files.add(rel_path); self.delta.pop(file_id, None); return
+        try:
+            with open(os.path.join(self.root, rel_path), 'rb') as f: data = f.read()
+        except OSError:
+            data = b""
+        # Binary files get no postings and so never become candidates
+        self.delta[file_id] = np.empty(0, np.uint32) if b"\0" in data[:8192] else trigrams(data.lower())
+
+    def _remove_file(self, rel_path):
+        file_id = self.stats.pop(rel_path)[0]
+        self.paths[file_id] = None
+        self.stale.add(file_id)
+        self.delta.pop(file_id, None)
+        self.large_files.discard(rel_path)
+
+    def _merge(self):
+        """Folds the delta into the sorted base arrays."""
+        keep = ~np.isin(self.base_ids, np.fromiter(self.stale, np.uint32, len(self.stale)))
+        grams = [self.base_grams[keep]] + list(self.delta.values())
+        ids = [self.base_ids[keep]] + [np.full(len(g), fid, np.uint32) for fid, g in self.delta.items()]
+        grams, ids = np.concatenate(grams), np.concatenate(ids)
+        order = np.argsort(grams, kind="stable")
+        self.base_grams, self.base_ids = grams[order], ids[order]
+        self.delta, self.stale = {}, set()
+
+    def candidates(self, search_term, regex=False):
+        """
+        Absolute paths of files that may contain a match, or None if the term
+        yields no usable trigrams and every file has to be checked.
+        """
+        literals = regex_required_literals(search_term) if regex else [search_term]
+        query = set()
+        for literal in literals:
+            grams = trigrams(literal.lower().encode('utf-8'))
+            # bytes.lower() in the index only folds ASCII, so non-ASCII trigrams can't be trusted
+            query.update(int(g) for g in grams if g < 0x800000 and (g >> 8) & 0xff < 0x80 and g & 0xff < 0x80)
+        with self.lock:
+            if not query:
+                file_ids = [entry[0] for entry in self.stats.values()]
+            else:
+                found = None
+                for gram in query:
+                    lo, hi = np.searchsorted(self.base_grams, np.array([gram, gram + 1], np.uint32))
+                    ids = self.base_ids[lo:hi]
+                    found = ids if found is None else np.intersect1d(found, ids, assume_unique=True)
+                    if not len(found): break
+                query_array = np.fromiter(query, np.uint32, len(query))
+                file_ids = [int(fid) for fid in found if int(fid) not in self.stale]
+                file_ids += [fid for fid, grams in self.delta.items() if np.isin(query_array, grams, assume_unique=True).all()]
+                file_ids += [self.stats[p][0] for p in self.large_files]
+            return [os.path.join(self.root, self.paths[fid]) for fid in dict.fromkeys(file_ids) if self.paths[fid] is not None]
 
 # ==============================================================================
-# AI BACKEND LOGIC
+# TOOL EXECUTION ENGINE
 # ==============================================================================
-class AI_Core(QObject):
+TOOL_REGISTRY = {}
+
+class ToolSpec:
+    """A registered tool: its Gemini schema, handler and scheduling metadata."""
+    def __init__(self, name, handler, schema, blocking=True, cacheable=False, idempotent=False,
+                 timeout=TOOL_DEFAULT_TIMEOUT, mutating=False, default_path=None, recursive=False):
+        self.name = name
+        self.handler = handler
+        self.schema = schema
+        self.is_async = asyncio.iscoroutinefunction(handler)
+        self.blocking = blocking                # Sync handlers that may block run on a worker
+        self.cacheable = cacheable              # Result depends only on the file system state
+        self.idempotent = idempotent            # Duplicate calls in one chunk can share a result
+        self.timeout = timeout
+        self.mutating = mutating                # Writes to the paths it is given
+        self.default_path = default_path        # Path acted on when no path argument is given
+        self.recursive = recursive              # Reads a whole tree, so a path stat can't validate a cached result
+        parameters = schema["parameters"]
+        self.required = parameters.get("required", [])
+        self.optional = [p for p in parameters["properties"] if p not in self.required]
+
+    def build_kwargs(self, args):
+        """Required arguments are always passed (None if missing); optional ones fall back to the handler's defaults."""
+        kwargs = {name: args.get(name) for name in self.required}
+        kwargs.update({name: args[name] for name in self.optional if args.get(name) is not None})
+        return kwargs
+
+def tool(description, properties=None, required=None, **metadata):
+    """Registers an AI_Core._<name> handler as the Gemini function <name>."""
+    def decorator(func):
+        name = func.__name__.lstrip("_")
+        parameters = {"type": "OBJECT", "properties": properties or {}}
+        if required: parameters["required"] = required
+        schema = {"name": name, "description": description, "parameters": parameters}
+        TOOL_REGISTRY[name] = ToolSpec(name, func, schema, **metadata)
+        return func
+    return decorator
+
+def tool_call_paths(spec, args):
+    """Absolute paths a function call reads or writes."""
+    paths = [args[key] for key in TOOL_PATH_ARGS if isinstance(args.get(key), str) and args.get(key)]
+    if spec.default_path and not paths: paths.append(spec.default_path)
+    return [os.path.abspath(p) for p in paths]
+
+def paths_overlap(a, b):
+    """True if a and b are the same path or one contains the other."""
+    return a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep)
+
+def path_signature(path):
+    """(mtime, size, inode) identifying one version of a file or directory listing."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class ToolResultCache:
     """
-    Handles all backend operations. Inherits from QObject to emit signals
-    for thread-safe communication with the GUI.
+    LRU cache of successful file tool results within a byte budget. Each entry
+    carries a validator (path signatures, or an index generation for tree-wide
+    tools) and is also dropped when a mutating tool or the watcher reports a
+    change under one of its paths.
     """
-    text_received = Signal(str)
-    end_of_turn = Signal()
-    frame_received = Signal(QImage)
-    search_results_received = Signal(list)
-    code_being_executed = Signal(str, str)
-    file_list_received = Signal(str, list)
-    video_mode_changed = Signal(str)
-    speaking_started = Signal()
-    speaking_stopped = Signal()
-    system_alert = Signal(str, str)  # New: for system alerts
+    def __init__(self, max_bytes=TOOL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # key -> (validator, paths, result, size)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self.bytes_saved = 0
+
+    def get(self, key, validator):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != validator:
+                if entry is not None: self._drop(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += entry[3]
+            return entry[2]
+
+    def put(self, key, validator, paths, result):
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes: return
+        with self.lock:
+            if key in self.entries: self._drop(key)
+            self.entries[key] = (validator, paths, result, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, path):
+        with self.lock:
+            stale = [key for key, entry in self.entries.items() if any(paths_overlap(path, p) for p in entry[1])]
+            for key in stale: self._drop(key)
+            self.invalidations += len(stale)
+
+    def _drop(self, key):
+        self.size -= self.entries.pop(key)[3]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "bytes_saved": self.bytes_saved}
+
+def is_watched_change(directory, path):
+    """
+    Whether a change the watcher saw can affect tool results: Ada's own writes
+    under ADA_DATA_DIR and anything the search walk skips are ignored.
+    """
+    if paths_overlap(path, ADA_DATA_DIR): return False
+    if SEARCH_IGNORED_DIRS.intersection(os.path.relpath(path, directory).split(os.sep)): return False
+    return is_searchable(directory, path)
 
-    def __init__(self, video_mode=DEFAULT_MODE):
-        super().__init__()
-        self.video_mode = video_mode
-        self.is_running = True
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+def plan_fs_watches(directory, max_dirs=FS_WATCH_MAX_DIRS):
+    """
+    Splits directory into watches that leave out what the search walk skips:
+    a subtree with nothing to skip gets one recursive watch, while a directory
+    with a skipped child is watched on its own and its other children are
+    planned in turn. Returns [(path, recursive)], or None past max_dirs.
+    """
+    count = 0
+    def plan(path, rules):
+        nonlocal count
+        count += 1
+        if count > max_dirs: return False, None
+        skipped, watches = False, []
+        try:
+            with os.scandir(path) as it: children = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            children = []
+        clean_children = []
+        for entry in children:
+            if entry.name in SEARCH_IGNORED_DIRS or is_ignored(entry.path, True, rules) or paths_overlap(entry.path, ADA_DATA_DIR):
+                skipped = True; continue
+            clean, child_watches = plan(entry.path, rules + load_gitignore(entry.path))
+            if child_watches is None: return False, None
+            clean_children.append(clean); watches += child_watches
+        if not skipped and all(clean_children): return True, [(path, True)]
+        return False, [(path, False)] + watches
+    try:
+        return plan(directory, load_gitignore(directory))[1]
+    except RecursionError:
+        return None
 
-        # Enhanced Tool Definitions
-        create_folder = {
-            "name": "create_folder",
-            "description": "Creates a new folder at the specified path relative to the script's root directory.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": { "folder_path": { "type": "STRING", "description": "The path for the new folder (e.g., 'new_project/assets')."}},
-                "required": ["folder_path"]
-            }
-        }
+class FileWatcher:
+    """
+    Reports changed paths under a directory through watchdog. The watches are
+    planned and added on a background thread, so a large tree never stalls
+    startup, and a tree too large to watch (or an exhausted inotify limit)
+    just leaves caches to their own validation.
+    """
+    def __init__(self, directory, on_change):
+        self.directory = os.path.abspath(directory)
+        self.on_change = on_change
+        self.observer = None
+        self.lock = threading.Lock()
+        self.stopped = False
 
-        create_file = {
-            "name": "create_file",
-            "description": "Creates a new file with specified content at a given path.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "file_path": { "type": "STRING", "description": "The path for the new file (e.g., 'new_project/notes.txt')."},
-                    "content": { "type": "STRING", "description": "The content to write into the new file."}
-                },
-                "required": ["file_path", "content"]
-            }
-        }
+    def start(self):
+        threading.Thread(target=self._run, name="ada-fs-watch", daemon=True).start()
 
-        edit_file = {
-            "name": "edit_file",
-            "description": "Appends content to an existing file at a specified path.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "file_path": { "type": "STRING", "description": "The path of the file to edit (e.g., 'project/notes.txt')."},
-                    "content": { "type": "STRING", "description": "The content to append to the file."}
-                },
-                "required": ["file_path", "content"]
-            }
-        }
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            observer, self.observer = self.observer, None
+        if observer is not None: observer.stop()
 
-        list_files = {
-            "name": "list_files",
-            "description": "Lists all files and directories within a specified folder. Defaults to the current directory if no path is provided.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "directory_path": { "type": "STRING", "description": "The path of the directory to inspect. Defaults to '.' (current directory) if omitted."}
-                }
-            }
-        }
+    def _run(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return
+        directory, on_change = self.directory, self.on_change
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed", "closed_no_write"): return
+                changed = [event.src_path] + ([event.dest_path] if getattr(event, "dest_path", "") else [])
+                changed = [path for path in map(os.path.abspath, changed) if is_watched_change(directory, path)]
+                if changed: on_change(changed)
+
+        watches = plan_fs_watches(directory)
+        if watches is None or len(watches) > FS_WATCH_MAX_WATCHES:
+            print(f">>> [INFO] '{directory}' is too large to watch; file caches will rely on their own checks.")
+            return
+        observer = Observer()
+        observer.daemon = True
+        try:
+            handler = Handler()
+            for path, recursive in watches: observer.schedule(handler, path, recursive=recursive)
+            observer.start()
+        except OSError as e:
+            print(f">>> [ERROR] Could not watch '{directory}' for changes: {e}")
+            observer.stop()
+            return
+        with self.lock:
+            if not self.stopped: self.observer = observer; return
+        observer.stop()
 
-        read_file = {
-            "name": "read_file",
-            "description": "Reads the entire content of a specified file.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "file_path": { "type": "STRING", "description": "The path of the file to read (e.g., 'project/notes.txt')."}
-                },
-                "required": ["file_path"]
-            }
-        }
+def start_fs_watcher(directory, on_change):
+    """Starts watching directory in the background; without watchdog the watcher simply never reports."""
+    watcher = FileWatcher(directory, on_change)
+    watcher.start()
+    return watcher
 
-        open_application = {
-            "name": "open_application",
-            "description": "Opens or launches a desktop application on the user's computer.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "application_name": { "type": "STRING", "description": "The name of the application to open (e.g., 'Notepad', 'Calculator', 'Chrome')."}
-                },
-                "required": ["application_name"]
-            }
-        }
+class ToolExecutor:
+    """
+    Runs tool handlers off the asyncio loop so audio and video tasks keep
+    flowing while a tool works. Blocking tools go to a bounded thread pool and
+    every call gets a timeout; a lazily created process pool is there for
+    tools, such as search_files, that fan work out to it themselves.
+    """
+    def __init__(self, max_threads=TOOL_THREAD_WORKERS, max_processes=TOOL_PROCESS_WORKERS):
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="ada-tool")
+        self.max_processes = max_processes
+        self._process_pool = None
+
+    @property
+    def process_pool(self):
+        """
+        Created lazily: most sessions never need it and workers are costly to
+        spawn. By then Qt, audio and capture threads are running, so workers are
+        never forked from this process; they start clean and re-import ada.py
+        under the IS_WORKER_PROCESS guard.
+        """
+        if self._process_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes, mp_context=multiprocessing.get_context(method))
+        return self._process_pool
+
+    async def run(self, func, kwargs, timeout=TOOL_DEFAULT_TIMEOUT):
+        """Runs func(**kwargs) on the thread pool and returns its result dict."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.thread_pool, functools.partial(func, **kwargs))
+        try:
+            # On timeout or cancellation the pending future is cancelled; a worker
+            # that already started is left to finish and its result is discarded.
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return {"status": "error", "message": f"Tool timed out after {timeout} seconds."}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"status": "error", "message": f"Tool execution failed: {str(e)}"}
 
-        open_website = {
-            "name": "open_website",
-            "description": "Opens a given URL in the default web browser.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "url": { "type": "STRING", "description": "The full URL of the website to open (e.g., 'https://www.google.com')."}
-                },
-                "required": ["url"]
-            }
-        }
+    async def execute(self, spec, owner, kwargs):
+        """Runs a registered tool the way its metadata asks for."""
+        if spec.is_async:
+            try:
+                return await asyncio.wait_for(spec.handler(owner, **kwargs), spec.timeout)
+            except asyncio.TimeoutError:
+                return {"status": "error", "message": f"Tool timed out after {spec.timeout} seconds."}
+        if not spec.blocking:
+            return spec.handler(owner, **kwargs)
+        return await self.run(functools.partial(spec.handler, owner), kwargs, timeout=spec.timeout)
+
+    def shutdown(self):
+        self.thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
 
-        # Enhanced Tools - JARVIS-like capabilities
-        delete_file = {
-            "name": "delete_file",
-            "description": "Deletes a file or directory at the specified path.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "path": {"type": "STRING", "description": "The path to delete"},
-                    "force": {"type": "BOOLEAN", "description": "Force deletion if True"}
-                },
-                "required": ["path"]
-            }
-        }
+# ==============================================================================
+# SYSTEM MONITORING
+# ==============================================================================
+class SystemMetricsSampler:
+    """
+    Samples CPU, memory, disk and network usage on a background thread into a
+    fixed-size ring buffer, so readers get the latest snapshot without waiting
+    on psutil. Alert thresholds are checked on every sample.
+    """
+    def __init__(self, interval=METRICS_SAMPLE_INTERVAL, history_size=METRICS_HISTORY_SIZE, on_alert=None):
+        self.interval = interval
+        self.samples = collections.deque(maxlen=history_size)
+        self.on_alert = on_alert
+        self.active_alerts = set()
+        self._last_net = None
+        self.platform = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None: return
+        # platform.processor() runs `uname -p` on Linux, so it is read once here rather than per request
+        self.platform = {"system": platform.system(), "processor": platform.processor()}
+        # The first non-blocking cpu_percent call only primes psutil's counters
+        psutil.cpu_percent(interval=None); psutil.cpu_percent(interval=None, percpu=True)
+        self._thread = threading.Thread(target=self._run, name="ada-metrics", daemon=True)
+        self._thread.start()
 
-        search_files = {
-            "name": "search_files",
-            "description": "Searches for files containing specific text or matching patterns.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "search_term": {"type": "STRING", "description": "Text to search for"},
-                    "file_pattern": {"type": "STRING", "description": "File pattern (e.g., *.py)"},
-                    "directory": {"type": "STRING", "description": "Directory to search in"}
-                },
-                "required": ["search_term"]
-            }
-        }
+    def stop(self):
+        self._stop_event.set()
 
-        rename_file = {
-            "name": "rename_file",
-            "description": "Renames or moves a file/directory.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "old_path": {"type": "STRING", "description": "Current path"},
-                    "new_path": {"type": "STRING", "description": "New path"}
-                },
-                "required": ["old_path", "new_path"]
-            }
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample_now()
+            except Exception as e:
+                print(f">>> [ERROR] Metrics sampling failed: {e}")
+
+    def sample_now(self):
+        """Takes one sample, stores it and checks the alert thresholds."""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(METRICS_DISK_PATH)
+        net = psutil.net_io_counters()
+        sent_rate = recv_rate = 0.0
+        if self._last_net is not None:
+            last_time, last_sent, last_recv = self._last_net
+            elapsed = max(now - last_time, 1e-6)
+            sent_rate = (net.bytes_sent - last_sent) / elapsed
+            recv_rate = (net.bytes_recv - last_recv) / elapsed
+        self._last_net = (now, net.bytes_sent, net.bytes_recv)
+
+        snapshot = {
+            "timestamp": now,
+            "cpu_usage": psutil.cpu_percent(interval=None),
+            "cpu_per_core": psutil.cpu_percent(interval=None, percpu=True),
+            "memory": {"total": memory.total, "available": memory.available, "percent": memory.percent},
+            "disk": {"total": disk.total, "free": disk.free, "percent": disk.percent},
+            "network": {"bytes_sent": net.bytes_sent, "bytes_recv": net.bytes_recv,
+                        "sent_per_sec": round(sent_rate, 1), "recv_per_sec": round(recv_rate, 1)}
         }
-
-        system_info = {
-            "name": "system_info",
-            "description": "Gets detailed system information (CPU, memory, disk, network).",
-            "parameters": {"type": "OBJECT", "properties": {}}
+        self.samples.append(snapshot)
+        self._check_alerts(snapshot)
+        return snapshot
+
+    def _check_alerts(self, snapshot):
+        """Emits an alert when a threshold is first crossed, and re-arms once usage drops back."""
+        checks = [
+            ("memory", "CRITICAL", "Memory", snapshot["memory"]["percent"], MEMORY_ALERT_PERCENT),
+            ("disk", "CRITICAL", "Disk", snapshot["disk"]["percent"], DISK_ALERT_PERCENT),
+            ("cpu", "WARNING", "CPU", snapshot["cpu_usage"], CPU_ALERT_PERCENT),
+        ]
+        for key, level, label, value, threshold in checks:
+            if value > threshold:
+                if key not in self.active_alerts:
+                    self.active_alerts.add(key)
+                    if self.on_alert: self.on_alert(level, f"{label} usage at {value}%")
+            else:
+                self.active_alerts.discard(key)
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def window_stats(self, seconds):
+        """Min/avg/max of the main metrics over the last `seconds` seconds."""
+        cutoff = time.time() - seconds
+        window = [s for s in list(self.samples) if s["timestamp"] >= cutoff]
+        if not window: return None
+        series = {
+            "cpu_usage": [s["cpu_usage"] for s in window],
+            "memory_percent": [s["memory"]["percent"] for s in window],
+            "disk_percent": [s["disk"]["percent"] for s in window],
+            "net_sent_per_sec": [s["network"]["sent_per_sec"] for s in window],
+            "net_recv_per_sec": [s["network"]["recv_per_sec"] for s in window],
         }
+        stats = {name: {"min": min(values), "avg": round(sum(values) / len(values), 1), "max": max(values)} for name, values in series.items()}
+        stats["samples"] = len(window)
+        stats["seconds"] = round(window[-1]["timestamp"] - window[0]["timestamp"], 1)
+        return stats
 
-        process_management = {
-            "name": "process_management",
-            "description": "Lists, starts, or stops system processes.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "action": {"type": "STRING", "description": "list|start|stop|kill"},
-                    "process_name": {"type": "STRING", "description": "Process to act on"},
-                    "process_id": {"type": "INTEGER", "description": "PID for stop/kill"}
-                },
-                "required": ["action"]
-            }
-        }
+# ==============================================================================
+# TEXT TO SPEECH
+# ==============================================================================
+def socket_is_open(websocket):
+    return websocket is not None and websocket.state.name == "OPEN"
 
-        open_in_editor = {
-            "name": "open_in_editor",
-            "description": "Opens a file in the default or specified code editor.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "file_path": {"type": "STRING", "description": "File to open"},
-                    "editor": {"type": "STRING", "description": "Specific editor (vscode, sublime, etc.)"}
-                },
-                "required": ["file_path"]
-            }
-        }
+class TextSegmenter:
+    """
+    Coalesces streamed text fragments into phrase and sentence units for TTS.
+    The first unit of a reply is released at its first phrase boundary so
+    audio starts quickly; later units batch whole sentences. Buffered text
+    that waits past its deadline is released at the last word boundary.
+    """
+    SENTENCE_END = re.compile(r'[.!?\u2026]+["\')\]]*\s+')
+    PHRASE_END = re.compile(r'(?:[.!?\u2026]+["\')\]]*|[,;:\u2013\u2014])\s+')
 
-        git_operations = {
-            "name": "git_operations",
-            "description": "Performs Git operations (commit, push, pull, status).",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "operation": {"type": "STRING", "description": "status|commit|push|pull|log"},
-                    "message": {"type": "STRING", "description": "Commit message"},
-                    "files": {"type": "STRING", "description": "Specific files to commit"}
-                },
-                "required": ["operation"]
-            }
-        }
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buffer = ""
+        self.first = True
+        self.started = None
+
+    def feed(self, text):
+        """Adds a fragment and returns the segments that are ready."""
+        if not self.buffer: self.started = time.monotonic()
+        self.buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None: break
+            segments.extend(self._take(cut))
+        return segments
+
+    def time_until_due(self):
+        """Seconds until the buffered text should be released anyway, or None if empty."""
+        if not self.buffer: return None
+        deadline = TTS_FIRST_SEGMENT_DEADLINE if self.first else TTS_SEGMENT_DEADLINE
+        return max(0.0, self.started + deadline - time.monotonic())
+
+    def flush_due(self):
+        """Releases buffered text up to its last phrase or word boundary."""
+        boundaries = [m.end() for m in self.PHRASE_END.finditer(self.buffer)] or [m.end() for m in re.finditer(r'\s+', self.buffer)]
+        if not boundaries:
+            self.started = time.monotonic()  # A single unfinished word; give it another deadline
+            return []
+        return self._take(boundaries[-1])
+
+    def flush(self):
+        """Releases everything at the end of a reply."""
+        segments = self._take(len(self.buffer))
+        self.reset()
+        return segments
+
+    def _find_cut(self):
+        text = self.buffer
+        if self.first:
+            for m in self.PHRASE_END.finditer(text):
+                if m.end() >= TTS_FIRST_SEGMENT_MIN_CHARS: return m.end()
+        else:
+            ends = [m.end() for m in self.SENTENCE_END.finditer(text) if m.end() <= TTS_SEGMENT_MAX_CHARS]
+            if ends and ends[-1] >= TTS_SEGMENT_MIN_CHARS: return ends[-1]
+        if len(text) <= TTS_SEGMENT_MAX_CHARS: return None
+        # Too long without a good boundary: fall back to a phrase, then a word boundary
+        window = text[:TTS_SEGMENT_MAX_CHARS]
+        ends = [m.end() for m in self.PHRASE_END.finditer(window)] or [m.end() for m in re.finditer(r'\s+', window)]
+        return ends[-1] if ends else TTS_SEGMENT_MAX_CHARS
+
+    def _take(self, cut):
+        segment, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:].lstrip()
+        self.started = time.monotonic() if self.buffer else None
+        if not segment: return []
+        self.first = False
+        return [segment]
+
+class TTSConnectionManager:
+    """
+    Keeps one ElevenLabs stream-input socket warm: connected, initialised with
+    the voice settings and API key, and kept alive between turns. A stream-input
+    socket serves a single generation (the server closes it after the final
+    audio), so acquire() hands the warm socket to the turn and immediately
+    starts warming the next one in the background. Connect failures are retried
+    with exponential backoff.
+    """
+    def __init__(self, uri, init_message):
+        self.uri = uri
+        self.init_message = init_message
+        self.socket = None
+        self.available = asyncio.Event()
+        self.taken = asyncio.Event()
+        self.task = None
+        self.warm_acquires = self.cold_acquires = self.reconnects = 0
+
+    def start(self):
+        if self.task is None: self.task = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        delay = TTS_RECONNECT_BASE_DELAY
+        while True:
+            if not socket_is_open(self.socket):
+                self._discard()
+                try:
+                    websocket = await websockets.connect(self.uri)
+                    await websocket.send(self.init_message)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.reconnects += 1
+                    print(f">>> [ERROR] TTS connect failed, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, TTS_RECONNECT_MAX_DELAY)
+                    continue
+                self.socket, delay = websocket, TTS_RECONNECT_BASE_DELAY
+                self.available.set()
+            self.taken.clear()
+            try:
+                await asyncio.wait_for(self.taken.wait(), TTS_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                try:
+                    # A lone space keeps the generation open without producing audio
+                    await self.socket.send(json.dumps({"text": " "}))
+                except Exception:
+                    self._discard()
+
+    def _discard(self):
+        self.available.clear()
+        if self.socket is not None: asyncio.create_task(self.socket.close())
+        self.socket = None
+
+    async def acquire(self):
+        """Hands over an initialised socket, waiting for one to be warmed if none is ready."""
+        self.start()
+        if socket_is_open(self.socket): self.warm_acquires += 1
+        else:
+            self.cold_acquires += 1
+            while not socket_is_open(self.socket):
+                self.taken.set()  # Wake the maintainer in case it is idling on a dead socket
+                await asyncio.wait_for(self.available.wait(), TTS_ACQUIRE_TIMEOUT)
+                if not socket_is_open(self.socket): self.available.clear()
+        websocket, self.socket = self.socket, None
+        self.available.clear()
+        self.taken.set()  # Start warming the next turn's socket now
+        return websocket
+
+    async def close(self):
+        if self.task: self.task.cancel()
+        if self.socket is not None: await self.socket.close()
+        self.socket = None
+
+    def stats(self):
+        return {"warm_acquires": self.warm_acquires, "cold_acquires": self.cold_acquires, "reconnects": self.reconnects}
+
+class SpeechCache:
+    """
+    On-disk LRU cache of synthesized PCM for short segments, keyed on the
+    voice, model, voice settings and normalized text. Files are named by key
+    and their mtime doubles as the recency stamp across restarts.
+    """
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # key -> size
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self.bytes_served = 0
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            files = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".pcm")]
+            for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+                self.entries[entry.name[:-4]] = entry.stat().st_size
+                self.size += entry.stat().st_size
+        except OSError as e:
+            print(f">>> [WARN] TTS cache unavailable: {e}")
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    def key(self, text):
+        identity = json.dumps([VOICE_ID, TTS_MODEL_ID, TTS_VOICE_SETTINGS, self.normalize(text)], sort_keys=True)
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def cacheable(self, text):
+        return 0 < len(self.normalize(text)) <= TTS_CACHE_MAX_CHARS
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pcm")
+
+    def get(self, text):
+        """Returns the cached PCM for text, or None."""
+        if not self.cacheable(text): return None
+        key = self.key(text)
+        with self.lock:
+            known = key in self.entries
+            if not known: self.misses += 1
+        if not known: return None
+        try:
+            with open(self._path(key), "rb") as f: pcm = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self.lock:
+                if key in self.entries: self.size -= self.entries.pop(key)
+                self.misses += 1
+            return None
+        with self.lock:
+            if key in self.entries: self.entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_served += len(pcm)
+        return pcm
+
+    def put(self, text, pcm):
+        if not pcm or not self.cacheable(text) or len(pcm) > self.max_bytes: return
+        key = self.key(text)
+        tmp_path = self._path(key) + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f: f.write(pcm)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f">>> [WARN] Could not write TTS cache entry: {e}")
+            return
+        with self.lock:
+            if key in self.entries: self.size -= self.entries.pop(key)
+            self.entries[key] = len(pcm)
+            self.size += len(pcm)
+            self.stores += 1
+            while self.size > self.max_bytes:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+                try: os.remove(self._path(old_key))
+                except OSError: pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0, "stores": self.stores,
+                    "evictions": self.evictions, "bytes_served": self.bytes_served}
 
-        system_notification = {
-            "name": "system_notification",
-            "description": "Shows desktop notifications.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "title": {"type": "STRING", "description": "Notification title"},
-                    "message": {"type": "STRING", "description": "Notification message"},
-                    "urgency": {"type": "STRING", "description": "low|normal|critical"}
-                },
-                "required": ["title", "message"]
-            }
-        }
+# ==============================================================================
+# AUDIO INPUT
+# ==============================================================================
+def pcm_levels(data):
+    """RMS and zero-crossing rate of an int16 PCM buffer."""
+    samples = np.frombuffer(data, dtype=np.int16)
+    if samples.size < 2: return 0.0, 0.0
+    as_float = samples.astype(np.float32)
+    rms = float(np.sqrt(np.mean(as_float * as_float)))
+    zcr = float(np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1]))) / (samples.size - 1)
+    return rms, zcr
+
+class VoiceActivityDetector:
+    """
+    Energy and zero-crossing gate for mic chunks. A segment opens after a few
+    consecutive speech chunks and is sent together with the pre-roll that led
+    up to it; it stays open through a hangover of quiet chunks so pauses
+    between words are kept. The noise floor tracks quiet chunks so the energy
+    threshold rises with background noise. While a segment is open it follows
+    the quietest recent chunk instead, so a steady hum loud enough to open a
+    segment soon stops counting as speech (speech always has quieter gaps);
+    a maximum segment length closes the segment regardless. While Ada speaks
+    the caller passes her playback level as an echo reference; speech has to
+    beat it, and chunks below it leave the noise floor alone.
+    """
+    def __init__(self):
+        self.preroll = collections.deque(maxlen=VAD_PREROLL_CHUNKS + VAD_START_CHUNKS)
+        self.active = False
+        self.speech_run = 0
+        self.quiet_run = 0
+        self.segment_chunks = 0
+        self.recent_rms = collections.deque(maxlen=VAD_FLOOR_WINDOW_CHUNKS)
+        self.noise_floor = VAD_RMS_THRESHOLD / VAD_NOISE_MULTIPLIER
+        self.chunks_in = self.chunks_sent = self.segments = 0
+
+    def is_speech(self, rms, zcr):
+        threshold = max(VAD_RMS_THRESHOLD, self.noise_floor * VAD_NOISE_MULTIPLIER)
+        return rms >= threshold and (zcr <= VAD_ZCR_MAX or rms >= 2 * threshold)
+
+    def process(self, data, rms, zcr, echo_level=0.0):
+        """Returns the events for one chunk: ("start", None), ("audio", bytes) and ("end", None)."""
+        self.chunks_in += 1
+        self.recent_rms.append(rms)
+        speech = self.is_speech(rms, zcr)
+        if rms < echo_level:
+            speech = False  # Ada's own voice coming back through the speakers, not the room's noise
+        elif not speech: self.noise_floor += 0.05 * (rms - self.noise_floor)
+        elif self.active and len(self.recent_rms) == self.recent_rms.maxlen:
+            quietest = min(self.recent_rms)
+            if quietest > self.noise_floor: self.noise_floor += 0.2 * (quietest - self.noise_floor)
+        if self.active:
+            self.chunks_sent += 1
+            self.segment_chunks += 1
+            events = [("audio", data)]
+            self.quiet_run = 0 if speech else self.quiet_run + 1
+            if self.quiet_run > VAD_HANGOVER_CHUNKS or self.segment_chunks >= VAD_MAX_SEGMENT_CHUNKS:
+                self.active = False
+                events.append(("end", None))
+            return events
+        self.preroll.append(data)
+        self.speech_run = self.speech_run + 1 if speech else 0
+        if self.speech_run < VAD_START_CHUNKS: return []
+        self.active, self.speech_run, self.quiet_run, self.segment_chunks = True, 0, 0, 0
+        self.segments += 1
+        events = [("start", None)] + [("audio", chunk) for chunk in self.preroll]
+        self.chunks_sent += len(self.preroll)
+        self.preroll.clear()
+        return events
+
+    def stats(self):
+        return {"active": self.active, "segments": self.segments, "chunks_in": self.chunks_in, "chunks_sent": self.chunks_sent,
+                "upload_ratio": round(self.chunks_sent / self.chunks_in, 3) if self.chunks_in else 0.0,
+                "noise_floor": round(self.noise_floor, 1)}
 
-        send_email = {
-            "name": "send_email",
-            "description": "Sends emails via SMTP.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "recipient": {"type": "STRING", "description": "Email address"},
-                    "subject": {"type": "STRING", "description": "Email subject"},
-                    "body": {"type": "STRING", "description": "Email content"},
-                    "attachments": {"type": "STRING", "description": "Files to attach"}
-                },
-                "required": ["recipient", "subject", "body"]
-            }
-        }
+# ==============================================================================
+# LIVE SESSION UPLINK
+# ==============================================================================
+class OutboundScheduler:
+    """
+    Strict-priority lanes for everything sent to the Live session: control
+    (text turns), then audio (mic chunks and activity markers, kept in order),
+    then video. Audio and video never block their producers: a full audio lane
+    drops its oldest chunk and the video lane keeps only the newest frame.
+    """
+    LANES = ("control", "audio", "video")
+
+    def __init__(self, limits=None):
+        self.limits = limits or {"control": UPLINK_CONTROL_MAX, "audio": UPLINK_AUDIO_MAX, "video": UPLINK_VIDEO_MAX}
+        self.lanes = {lane: collections.deque() for lane in self.LANES}  # lane -> (enqueued_at, item)
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.metrics = {lane: {"enqueued": 0, "sent": 0, "dropped": 0, "max_depth": 0, "wait_total": 0.0, "wait_max": 0.0}
+                        for lane in self.LANES}
+
+    def put_nowait(self, lane, item):
+        """Queues item on the audio or video lane, dropping stale entries if the lane is full."""
+        queue, metrics = self.lanes[lane], self.metrics[lane]
+        while len(queue) >= self.limits[lane]:
+            victim = next((entry for entry in queue if "activity" not in entry[1]), None) if lane == "audio" else queue[0]
+            if victim is None: break  # Never drop activity markers
+            queue.remove(victim)
+            metrics["dropped"] += 1
+        queue.append((time.monotonic(), item))
+        metrics["enqueued"] += 1
+        metrics["max_depth"] = max(metrics["max_depth"], len(queue))
+        self.ready.set()
+
+    async def put(self, lane, item):
+        """Queues item, waiting while the lane is full. Used for the control lane."""
+        while len(self.lanes[lane]) >= self.limits[lane]:
+            self.space.clear()
+            await self.space.wait()
+        queue, metrics = self.lanes[lane], self.metrics[lane]
+        queue.append((time.monotonic(), item))
+        metrics["enqueued"] += 1
+        metrics["max_depth"] = max(metrics["max_depth"], len(queue))
+        self.ready.set()
+
+    async def get(self):
+        """Returns (lane, item) from the highest-priority non-empty lane."""
+        while True:
+            for lane in self.LANES:
+                if self.lanes[lane]:
+                    enqueued_at, item = self.lanes[lane].popleft()
+                    self._record_wait(lane, enqueued_at)
+                    self.space.set()
+                    return lane, item
+            self.ready.clear()
+            await self.ready.wait()
+
+    def take_more(self, lane, limit, predicate):
+        """Pops up to limit further items from the front of lane while predicate holds."""
+        queue, items = self.lanes[lane], []
+        while queue and len(items) < limit and predicate(queue[0][1]):
+            enqueued_at, item = queue.popleft()
+            self._record_wait(lane, enqueued_at)
+            items.append(item)
+        if items: self.space.set()
+        return items
+
+    def _record_wait(self, lane, enqueued_at):
+        waited = time.monotonic() - enqueued_at
+        metrics = self.metrics[lane]
+        metrics["sent"] += 1
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+
+    def stats(self):
+        return {lane: {"depth": len(self.lanes[lane]), "enqueued": m["enqueued"], "sent": m["sent"], "dropped": m["dropped"],
+                       "max_depth": m["max_depth"], "avg_wait_ms": round(1000 * m["wait_total"] / m["sent"], 2) if m["sent"] else 0.0,
+                       "max_wait_ms": round(1000 * m["wait_max"], 2)}
+                for lane, m in self.metrics.items()}
+
+class AudioBatchController:
+    """
+    Chooses how many queued mic chunks to merge into one realtime send. The
+    limit doubles while audio is still backed up after a send and halves
+    once the lane drains, so an idle link sends single chunks immediately
+    and a slow one amortises framing and base64 overhead over bigger messages.
+    """
+    def __init__(self, max_chunks=UPLINK_AUDIO_BATCH_MAX):
+        self.max_chunks = max_chunks
+        self.limit = 1
+        self.sends = collections.deque()  # (time, chunks, bytes) within the rate window
+        self.total_sends = self.total_chunks = 0
+        self.last_batch = 0
+
+    def record(self, chunks, nbytes, backlog):
+        now = time.monotonic()
+        self.sends.append((now, chunks, nbytes))
+        while self.sends and now - self.sends[0][0] > UPLINK_RATE_WINDOW: self.sends.popleft()
+        self.total_sends += 1
+        self.total_chunks += chunks
+        self.last_batch = chunks
+        self.limit = min(self.max_chunks, self.limit * 2) if backlog else max(1, self.limit // 2)
+
+    def stats(self):
+        window = max(1e-6, min(UPLINK_RATE_WINDOW, time.monotonic() - self.sends[0][0])) if self.sends else 1.0
+        return {"batch_limit": self.limit, "last_batch": self.last_batch,
+                "avg_batch": round(self.total_chunks / self.total_sends, 2) if self.total_sends else 0.0,
+                "sends_per_sec": round(len(self.sends) / window, 2),
+                "kbytes_per_sec": round(sum(entry[2] for entry in self.sends) / window / 1024, 1)}
 
-        web_automation = {
-            "name": "web_automation",
-            "description": "Automates web browsing tasks.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "action": {"type": "STRING", "description": "screenshot|extract_data|fill_form"},
-                    "url": {"type": "STRING", "description": "Website URL"},
-                    "data": {"type": "STRING", "description": "Data to extract or form data"}
-                },
-                "required": ["action", "url"]
-            }
-        }
+# ==============================================================================
+# VIDEO CAPTURE
+# ==============================================================================
+def find_window_rect(title):
+    """Screen rectangle of the first visible window whose title contains title, or None."""
+    try:
+        import pygetwindow
+    except ImportError:
+        pygetwindow = None
+    if pygetwindow is not None:
+        for window in pygetwindow.getWindowsWithTitle(title):
+            if window.width > 0 and window.height > 0:
+                return {"left": window.left, "top": window.top, "width": window.width, "height": window.height}
+        return None
+    if sys.platform.startswith("linux") and shutil.which("xdotool"):
+        ids = subprocess.run(["xdotool", "search", "--onlyvisible", "--name", title], capture_output=True, text=True, timeout=2).stdout.split()
+        if not ids: return None
+        shell = subprocess.run(["xdotool", "getwindowgeometry", "--shell", ids[0]], capture_output=True, text=True, timeout=2).stdout
+        geometry = dict(line.split("=", 1) for line in shell.splitlines() if "=" in line)
+        return {"left": int(geometry["X"]), "top": int(geometry["Y"]), "width": int(geometry["WIDTH"]), "height": int(geometry["HEIGHT"])}
+    raise RuntimeError("Window capture needs pygetwindow (or xdotool on Linux).")
+
+class ScreenCapture:
+    """
+    Grabs one region of the screen with mss: the whole virtual desktop, a
+    single monitor, a window followed as it moves, or a fixed rectangle.
+    mss handles are not thread-safe, so each capturing thread keeps its own,
+    created on first use and reused for every later grab.
+    """
+    def __init__(self, region=DEFAULT_SCREEN_REGION):
+        self.local = threading.local()
+        self.window_bbox = None
+        self.window_checked = 0.0
+        self.region = self.parse_region(region)
+
+    @staticmethod
+    def parse_region(spec):
+        """Parses a region spec into (kind, value), raising ValueError if it is malformed."""
+        kind, _, value = (spec or "all").strip().partition(":")
+        kind = kind.lower()
+        if kind == "all": return ("monitor", 0)
+        if kind == "monitor": return ("monitor", int(value or 1))
+        if kind == "window" and value.strip(): return ("window", value.strip())
+        if kind == "rect":
+            parts = value.split(",")
+            if len(parts) != 4: raise ValueError("A rectangle needs left,top,width,height.")
+            left, top, width, height = (int(part) for part in parts)
+            if width <= 0 or height <= 0: raise ValueError("Rectangle width and height must be positive.")
+            return ("rect", {"left": left, "top": top, "width": width, "height": height})
+        raise ValueError(f"Unrecognised screen region '{spec}'.")
+
+    def set_region(self, spec):
+        """Switches to a new region, keeping the current one if the new one can't be captured."""
+        previous = (self.region, self.window_bbox, self.window_checked)
+        self.region, self.window_bbox, self.window_checked = self.parse_region(spec), None, 0.0
+        try:
+            return self.bbox()
+        except Exception:
+            self.region, self.window_bbox, self.window_checked = previous
+            raise
+
+    def _grabber(self):
+        grabber = getattr(self.local, "grabber", None)
+        if grabber is None:
+            import mss
+            grabber = self.local.grabber = mss.mss()
+        return grabber
+
+    def monitors(self):
+        return self._grabber().monitors
+
+    def bbox(self):
+        """Current capture rectangle, clipped to the virtual desktop."""
+        monitors = self.monitors()
+        kind, value = self.region
+        if kind == "monitor":
+            if not 0 <= value < len(monitors): raise ValueError(f"Monitor {value} not found; {len(monitors) - 1} available.")
+            return dict(monitors[value])
+        if kind == "window":
+            if self.window_bbox is None or time.monotonic() - self.window_checked > SCREEN_WINDOW_REFRESH:
+                self.window_bbox = find_window_rect(value) or self.window_bbox
+                self.window_checked = time.monotonic()
+            if self.window_bbox is None: raise ValueError(f"No visible window titled '{value}'.")
+            box = self.window_bbox
+        else: box = value
+        desktop = monitors[0]
+        left, top = max(box["left"], desktop["left"]), max(box["top"], desktop["top"])
+        right = min(box["left"] + box["width"], desktop["left"] + desktop["width"])
+        bottom = min(box["top"] + box["height"], desktop["top"] + desktop["height"])
+        if right <= left or bottom <= top: raise ValueError("Capture region is off screen.")
+        return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+    def grab_bgra(self, bbox=None):
+        """Returns the region as a BGRA array backed by the grab."""
+        return np.asarray(self._grabber().grab(bbox or self.bbox()))
+
+    def grab(self):
+        """Returns the region as a BGR array."""
+        return cv2.cvtColor(self.grab_bgra(), cv2.COLOR_BGRA2BGR)
+
+class FrameSlot:
+    """
+    Latest-frame hand-off between one capture thread and any number of
+    readers. The writer fills a preallocated back buffer and publishes it
+    with a new sequence number; readers lease the front buffer and use it in
+    place. A buffer is only rewritten once no reader holds a lease on it.
+    """
+    sequence = itertools.count(1)  # Shared, so a frame from a new slot never repeats an old sequence number
+
+    def __init__(self, buffers=FRAME_SLOT_BUFFERS):
+        self.lock = threading.Lock()
+        self.buffers = [None] * buffers
+        self.leases = [0] * buffers
+        self.front = None
+        self.seq = 0
+
+    def back_buffer(self, shape):
+        """Returns (index, array) of a writable buffer of the given shape, or None if all are in use."""
+        with self.lock:
+            for index, buffer in enumerate(self.buffers):
+                if index == self.front or self.leases[index]: continue
+                if buffer is None or buffer.shape != shape:
+                    buffer = self.buffers[index] = np.empty(shape, dtype=np.uint8)
+                return index, buffer
+        return None
+
+    def publish(self, index):
+        with self.lock:
+            self.front = index
+            self.seq = next(self.sequence)
+
+    @contextlib.contextmanager
+    def read(self):
+        """Leases the latest frame for the with block, yielding (seq, frame); frame is None before the first publish."""
+        with self.lock:
+            index, seq = self.front, self.seq
+            if index is not None: self.leases[index] += 1
+        try:
+            yield seq, (self.buffers[index] if index is not None else None)
+        finally:
+            if index is not None:
+                with self.lock: self.leases[index] -= 1
+
+class DisplayFramePool:
+    """
+    Preallocated preview frames handed to the GUI by token. A frame is left
+    untouched until the GUI releases its token, so it can be wrapped in a
+    QImage without a deep copy.
+    """
+    def __init__(self, size=DISPLAY_POOL_BUFFERS):
+        self.lock = threading.Lock()
+        self.buffers = [None] * size
+        self.in_use = [False] * size
+
+    def acquire(self, shape):
+        """Returns (token, array) of a free buffer of the given shape, or None if the GUI holds them all."""
+        with self.lock:
+            for token, buffer in enumerate(self.buffers):
+                if self.in_use[token]: continue
+                if buffer is None or buffer.shape != shape:
+                    buffer = self.buffers[token] = np.empty(shape, dtype=np.uint8)
+                self.in_use[token] = True
+                return token, buffer
+        return None
+
+    def release(self, token):
+        with self.lock: self.in_use[token] = False
+
+class CaptureThread:
+    """
+    Captures one source, "camera" or "screen", on a long-lived thread into its
+    own FrameSlot, paced to CAPTURE_FPS. A frame is dropped, and counted, when
+    every buffer is still leased by readers.
+    """
+    def __init__(self, source, screen_capture, on_frame=None):
+        self.source = source
+        self.screen_capture = screen_capture
+        self.on_frame = on_frame
+        self.slot = FrameSlot()
+        self.shape = None
+        self.captured = self.dropped = self.failed = 0
+        self.recent = collections.deque(maxlen=CAPTURE_FPS)  # Publish times, for the measured fps
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ada-capture-{source}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if timeout is not None: self._thread.join(timeout)
+
+    def _open_camera(self):
+        """
+        Opens the camera, retrying with backoff while it is missing or still held
+        by the previous capture thread. None if the thread was stopped first.
+        """
+        delay, max_delay = CAMERA_OPEN_RETRY
+        while not self._stop_event.is_set():
+            camera = cv2.VideoCapture(CAMERA_INDEX)
+            if camera.isOpened(): return camera
+            camera.release()
+            self.failed += 1
+            print(f">>> [ERROR] Could not open camera {CAMERA_INDEX}; retrying in {delay:g} s")
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, max_delay)
+        return None
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        camera = None
+        try:
+            if self.source == "camera":
+                camera = self._open_camera()
+                if camera is None: return
+            period = 1.0 / CAPTURE_FPS
+            next_due = time.monotonic()
+            while not self._stop_event.is_set():
+                try:
+                    if camera is not None: self._capture_camera(camera)
+                    else: self._capture_screen()
+                except Exception as e:
+                    self.failed += 1
+                    print(f">>> [ERROR] Video capture error: {e}")
+                    self._stop_event.wait(1.0)
+                next_due = max(next_due + period, time.monotonic())
+                self._stop_event.wait(next_due - time.monotonic())
+        finally:
+            if camera is not None: camera.release()
+
+    def _capture_camera(self, camera):
+        if not camera.grab():
+            self.failed += 1; return
+        target = self.slot.back_buffer(self.shape) if self.shape else None
+        if self.shape and target is None:
+            self.dropped += 1; return
+        ok, frame = camera.retrieve(target[1] if target else None)
+        if not ok:
+            self.failed += 1; return
+        if target is None or frame is not target[1]:
+            # First frame, or the camera changed resolution: size the buffers and copy this one in
+            self.shape = frame.shape
+            target = self.slot.back_buffer(self.shape)
+            if target is None:
+                self.dropped += 1; return
+            np.copyto(target[1], frame)
+        self._publish(target[0])
+
+    def _capture_screen(self):
+        bbox = self.screen_capture.bbox()
+        target = self.slot.back_buffer((bbox["height"], bbox["width"], 3))
+        if target is None:
+            self.dropped += 1; return
+        bgra = self.screen_capture.grab_bgra(bbox)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=target[1])
+        self._publish(target[0])
+
+    def _publish(self, index):
+        if self._stop_event.is_set(): return
+        self.slot.publish(index)
+        self.captured += 1
+        self.recent.append(time.monotonic())
+        if self.on_frame is not None: self.on_frame(self.slot.buffers[index])
+
+    def fps(self):
+        if len(self.recent) < 2: return 0.0
+        return (len(self.recent) - 1) / max(self.recent[-1] - self.recent[0], 1e-6)
+
+class CaptureManager:
+    """
+    Owns the capture thread for the current video source. Switching sources
+    signals the old thread to stop and starts a new one with a fresh slot,
+    without waiting for the old device to be released; readers always go
+    through read() and so follow the switch immediately. Switching to the
+    current source restarts its thread if it has died.
+    """
+    def __init__(self, screen_capture, on_display_frame=None):
+        self.screen_capture = screen_capture
+        self.on_display_frame = on_display_frame
+        self.display_size = None
+        self.display_pool = DisplayFramePool()
+        self.display_dropped = 0
+        self.worker = None
+        self.empty_slot = FrameSlot()
+        self.lock = threading.Lock()
+        self.totals = {"captured": 0, "dropped": 0, "failed": 0}
+        self.switches = 0
+
+    def switch(self, source):
+        with self.lock:
+            if (self.worker.source if self.worker else None) == source and (self.worker is None or self.worker.is_alive()): return
+            if self.worker is not None:
+                self.worker.stop()
+                for key in self.totals: self.totals[key] += getattr(self.worker, key)
+            self.worker = CaptureThread(source, self.screen_capture, self._deliver_display_frame) if source in ("camera", "screen") else None
+            if self.worker is not None: self.worker.start()
+            self.switches += 1
+
+    def set_display_size(self, width, height):
+        """Size, in device pixels, that preview frames are scaled to fit."""
+        self.display_size = (width, height) if width > 0 and height > 0 else None
+
+    def _deliver_display_frame(self, frame):
+        """Runs on the capture thread: scales the frame into a pooled buffer and hands it to the GUI."""
+        size = self.display_size
+        if self.on_display_frame is None or size is None: return
+        h, w = frame.shape[:2]
+        scale = min(size[0] / w, size[1] / h)
+        out_w, out_h = max(1, int(w * scale)), max(1, int(h * scale))
+        lease = self.display_pool.acquire((out_h, out_w, 3))
+        if lease is None:
+            self.display_dropped += 1; return  # The GUI is behind; it still shows the previous frame
+        token, buffer = lease
+        cv2.resize(frame, (out_w, out_h), dst=buffer, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        self.on_display_frame(token, buffer)
+
+    def release_display_frame(self, token):
+        self.display_pool.release(token)
+
+    def read(self):
+        worker = self.worker
+        return (worker.slot if worker is not None else self.empty_slot).read()
+
+    def stop(self):
+        worker = self.worker
+        self.switch(None)
+        if worker is not None: worker.stop(timeout=2.0)
+
+    def stats(self):
+        worker = self.worker
+        current = {key: getattr(worker, key) if worker else 0 for key in self.totals}
+        return {"source": worker.source if worker else None, "fps": round(worker.fps(), 1) if worker else 0.0,
+                "switches": self.switches, "display_dropped": self.display_dropped,
+                **{key: self.totals[key] + current[key] for key in self.totals}}
+
+# ==============================================================================
+# VIDEO UPLOAD
+# ==============================================================================
+class FrameChangeDetector:
+    """
+    Decides whether a frame differs enough from the last uploaded one to be
+    worth encoding. Frames are reduced to a small grayscale thumbnail and
+    compared block by block, so a change confined to one part of the view
+    isn't averaged away. A keyframe interval forces a periodic refresh.
+    """
+    def __init__(self):
+        self.reference = None
+        self.reference_mode = None
+        self.last_sent = 0.0
+        self.last_score = None
+        self.checked = self.skipped = 0
+
+    def thumbnail(self, frame):
+        # Striding first keeps the area resize from touching every pixel of a 4K frame
+        step = max(1, min(frame.shape[0] // FRAME_DIFF_SIZE[1], frame.shape[1] // FRAME_DIFF_SIZE[0]) // 2)
+        small = cv2.resize(frame[::step, ::step], FRAME_DIFF_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def score(self, thumb):
+        """Largest per-block mean absolute difference against the reference thumbnail."""
+        diff = cv2.absdiff(thumb, self.reference)
+        h, w = diff.shape
+        b = FRAME_DIFF_BLOCK
+        blocks = diff[:h - h % b, :w - w % b].reshape(h // b, b, w // b, b).mean(axis=(1, 3))
+        return float(blocks.max())
+
+    def check(self, frame, mode):
+        """Returns (changed, score). The score is None when there was nothing to compare against."""
+        self.checked += 1
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+        score = None if self.reference is None or mode != self.reference_mode else self.score(thumb)
+        self.last_score = score
+        if score is not None and score <= FRAME_DIFF_THRESHOLDS.get(mode, 0.0) and now - self.last_sent < FRAME_KEYFRAME_INTERVAL:
+            self.skipped += 1
+            return False, score
+        self.reference, self.reference_mode, self.last_sent = thumb, mode, now
+        return True, score
+
+    def stats(self):
+        return {"checked": self.checked, "skipped": self.skipped,
+                "last_score": round(self.last_score, 2) if self.last_score is not None else None}
+
+class FrameEncoder:
+    """
+    Downscales BGR frames with an area filter and encodes them to JPEG on a
+    dedicated worker thread, using TurboJPEG when it is installed and
+    cv2.imencode otherwise. The resize target buffer is reused between frames
+    of the same size; being single-threaded, the worker owns it exclusively.
+    """
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-encode")
+        self.turbo = None
+        try:
+            from turbojpeg import TurboJPEG
+            self.turbo = TurboJPEG()
+        except Exception:  # Not installed, or the libturbojpeg shared library is missing
+            pass
+        self.resized = None
+        self.encodes = 0
+        self.encode_seconds = 0.0
+        self.encoded_bytes = 0
+
+    def encode(self, frame, max_dimension=FRAME_MAX_DIMENSION, quality=FRAME_JPEG_QUALITY):
+        started = time.perf_counter()
+        h, w = frame.shape[:2]
+        scale = min(1.0, max_dimension / max(h, w))
+        if scale < 1.0:
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            if self.resized is None or self.resized.shape[:2] != (size[1], size[0]):
+                self.resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            frame = cv2.resize(frame, size, dst=self.resized, interpolation=cv2.INTER_AREA)
+        if self.turbo is not None:
+            data = self.turbo.encode(frame, quality=quality)
+        else:
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok: raise RuntimeError("JPEG encoding failed")
+            data = buffer.tobytes()
+        self.encodes += 1
+        self.encode_seconds += time.perf_counter() - started
+        self.encoded_bytes += len(data)
+        return data
+
+    async def encode_async(self, frame, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(self.encode, frame, **kwargs))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        return {"backend": "turbojpeg" if self.turbo is not None else "opencv", "encodes": self.encodes,
+                "avg_encode_ms": round(1000 * self.encode_seconds / self.encodes, 2) if self.encodes else 0.0,
+                "avg_kbytes": round(self.encoded_bytes / self.encodes / 1024, 1) if self.encodes else 0.0}
+
+class VideoUploadController:
+    """
+    Adapts frame upload rate, size and JPEG quality to the link and the scene.
+    A link level in [0, 1] drops multiplicatively on congestion (slow frame
+    sends, frames replaced before they were sent, or mic audio backing up) and
+    recovers additively otherwise; it scales all three settings. Scene motion,
+    taken from the change detector's scores, additionally scales the frame rate.
+    """
+    def __init__(self):
+        self.level = 0.5
+        self.motion = 0.5
+        self.send_latency = None
+        self.seen_drops = 0
+        self.congestion_events = 0
+
+    def record_send(self, seconds):
+        self.send_latency = seconds if self.send_latency is None else 0.7 * self.send_latency + 0.3 * seconds
+
+    def record_diff(self, score, mode):
+        if score is None: return
+        threshold = max(FRAME_DIFF_THRESHOLDS.get(mode, 1.0), 1.0)
+        self.motion = 0.6 * self.motion + 0.4 * min(1.0, score / (10 * threshold))
+
+    def update(self, uplink_stats):
+        dropped = uplink_stats["video"]["dropped"]
+        congested = (dropped > self.seen_drops
+                     or uplink_stats["audio"]["depth"] > VIDEO_AUDIO_BACKLOG_LIMIT
+                     or (self.send_latency is not None and self.send_latency > VIDEO_SEND_LATENCY_TARGET))
+        self.seen_drops = dropped
+        if congested:
+            self.level *= 0.6
+            self.congestion_events += 1
+        else: self.level = min(1.0, self.level + 0.05)
+
+    @staticmethod
+    def _scale(bounds, amount):
+        return bounds[0] + (bounds[1] - bounds[0]) * amount
+
+    def fps(self):
+        return self._scale(VIDEO_FPS_RANGE, self.level * (0.25 + 0.75 * self.motion))
+
+    def max_dimension(self):
+        return int(self._scale(VIDEO_DIMENSION_RANGE, self.level))
+
+    def quality(self):
+        return int(self._scale(VIDEO_QUALITY_RANGE, self.level))
+
+    def stats(self):
+        return {"level": round(self.level, 2), "motion": round(self.motion, 2), "fps": round(self.fps(), 2),
+                "max_dimension": self.max_dimension(), "quality": self.quality(), "congestion_events": self.congestion_events,
+                "send_latency_ms": round(1000 * self.send_latency, 1) if self.send_latency is not None else None}
+
+# ==============================================================================
+# AUDIO OUTPUT
+# ==============================================================================
+class AudioOutputEngine:
+    """
+    Jitter buffer in front of a callback-mode PyAudio output stream. The event
+    loop copies PCM into a preallocated ring buffer and the PortAudio thread
+    drains it. Playback starts once the prebuffer target is reached (or the
+    reply has ended), and a dry buffer is padded with silence. Each period is
+    assembled in a preallocated buffer; PyAudio only accepts bytes back, so the
+    one copy into those is all the callback allocates, and silence is a shared
+    constant.
+    """
+    def __init__(self, rate=RECEIVE_SAMPLE_RATE, channels=CHANNELS, capacity_seconds=PLAYBACK_BUFFER_SECONDS,
+                 prebuffer_ms=PLAYBACK_PREBUFFER_MS, frames_per_buffer=PLAYBACK_FRAMES_PER_BUFFER):
+        self.rate = rate
+        self.channels = channels
+        self.frame_bytes = 2 * channels
+        self.frames_per_buffer = frames_per_buffer
+        self.capacity = int(rate * capacity_seconds) * self.frame_bytes
+        self.prebuffer_bytes = int(rate * prebuffer_ms / 1000) * self.frame_bytes
+        self.buffer = bytearray(self.capacity)
+        self.buffer_view = memoryview(self.buffer)
+        self._size_period(frames_per_buffer)
+        self.read_pos = 0
+        self.count = 0
+        self.lock = threading.Lock()
+        self.playing = False
+        self.ended = False
+        self.epoch = 0  # Bumped by clear() so a waiting writer drops the rest of its chunk
+        self.stream = None
+        self.underruns = self.overruns = 0
+        self.padded_frames = self.played_frames = 0
+        self.level = 0.0  # Decaying RMS of what was just played; the echo reference for barge-in
+
+    def start(self):
+        self.stream = pya.open(format=pyaudio.paInt16, channels=self.channels, rate=self.rate, output=True,
+                               frames_per_buffer=self.frames_per_buffer, stream_callback=self._callback)
+        self.stream.start_stream()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream(); self.stream.close()
+            self.stream = None
+
+    def _size_period(self, frame_count):
+        """(Re)allocates the per-period buffers; only runs again if PortAudio changes the period."""
+        period_bytes = frame_count * self.frame_bytes
+        self.period = bytearray(period_bytes)
+        self.period_view = memoryview(self.period)
+        self.silence = bytes(period_bytes)
+        self.silence_view = memoryview(self.silence)
+        self.level_samples = np.empty(period_bytes // 2, np.float32)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        wanted = frame_count * self.frame_bytes
+        if wanted != len(self.period): self._size_period(frame_count)
+        with self.lock:
+            if not self.playing and self.count and (self.count >= self.prebuffer_bytes or self.ended):
+                self.playing = True
+            take = min(self.count, wanted) if self.playing else 0
+            first = min(take, self.capacity - self.read_pos)
+            self.period_view[:first] = self.buffer_view[self.read_pos:self.read_pos + first]
+            self.period_view[first:take] = self.buffer_view[:take - first]
+            self.read_pos = (self.read_pos + take) % self.capacity
+            self.count -= take
+            if self.playing and take < wanted:
+                self.playing = False  # Ran dry: re-prime before playing again
+                if not self.ended: self.underruns += 1
+            self.played_frames += take // self.frame_bytes
+            if take < wanted: self.padded_frames += (wanted - take) // self.frame_bytes
+        if not take:
+            self.level *= PLAYBACK_LEVEL_DECAY
+            return self.silence, pyaudio.paContinue
+        if take < wanted: self.period_view[take:] = self.silence_view[take:]
+        samples = self.level_samples[:take // 2]
+        np.copyto(samples, np.frombuffer(self.period, np.int16, take // 2), casting="unsafe")
+        self.level = max(math.sqrt(float(np.dot(samples, samples)) / len(samples)), self.level * PLAYBACK_LEVEL_DECAY)
+        return bytes(self.period), pyaudio.paContinue
+
+    def _push(self, data):
+        """Copies as much of data as fits and returns the number of bytes taken."""
+        with self.lock:
+            n = min(len(data), self.capacity - self.count)
+            n -= n % self.frame_bytes
+            write_pos = (self.read_pos + self.count) % self.capacity
+            first = min(n, self.capacity - write_pos)
+            self.buffer[write_pos:write_pos + first] = data[:first]
+            self.buffer[:n - first] = data[first:n]
+            self.count += n
+            if n: self.ended = False
+            return n
+
+    async def write(self, data):
+        """Queues PCM for playback, waiting for room if the buffer is full."""
+        view = memoryview(data)[:len(data) - len(data) % self.frame_bytes]
+        stalled, epoch = False, self.epoch
+        while len(view) and self.stream is not None and epoch == self.epoch:
+            view = view[self._push(view):]
+            if len(view):
+                stalled = True
+                await asyncio.sleep(self.frames_per_buffer / self.rate)
+        if stalled: self.overruns += 1
+
+    def mark_end(self):
+        """Marks the end of a reply so a short tail plays without waiting for the prebuffer."""
+        with self.lock: self.ended = True
+
+    def clear(self):
+        """Drops everything not yet played."""
+        with self.lock:
+            self.read_pos = self.count = 0
+            self.playing = False
+            self.epoch += 1
+
+    def buffered_ms(self):
+        return 1000 * self.count // (self.rate * self.frame_bytes)
+
+    def stats(self):
+        return {"buffered_ms": self.buffered_ms(), "underruns": self.underruns, "overruns": self.overruns,
+                "padded_frames": self.padded_frames, "played_frames": self.played_frames}
+
+# ==============================================================================
+# AI BACKEND LOGIC
+# ==============================================================================
+class AI_Core(QObject):
+    """
+    Handles all backend operations. Inherits from QObject to emit signals
+    for thread-safe communication with the GUI.
+    """
+    text_received = Signal(str)
+    end_of_turn = Signal()
+    frame_received = Signal(QImage, int)  # Preview frame and its pool token, to be passed back to release_frame
+    search_results_received = Signal(list)
+    code_being_executed = Signal(str, str)
+    file_list_received = Signal(str, list)
+    video_mode_changed = Signal(str)
+    speaking_started = Signal()
+    speaking_stopped = Signal()
+    system_alert = Signal(str, str)  # New: for system alerts
+
+    def __init__(self, video_mode=DEFAULT_MODE, screen_region=DEFAULT_SCREEN_REGION):
+        super().__init__()
+        self.video_mode = video_mode
+        self.screen_capture = ScreenCapture(screen_region)
+        self.is_running = True
+        self.client = genai.Client(api_key=GEMINI_API_KEY)
 
-        get_current_time = {
-            "name": "get_current_time",
-            "description": "Gets the current date and time from the user's computer in various formats.",
-            "parameters": {
-                "type": "OBJECT",
-                "properties": {
-                    "format": {"type": "STRING", "description": "Format type: 'full', 'time', 'date', 'timestamp', 'iso', 'custom'"},
-                    "timezone": {"type": "STRING", "description": "Timezone (e.g., 'UTC', 'local', 'US/Eastern')"},
-                    "custom_format": {"type": "STRING", "description": "Custom strftime format string (e.g., '%Y-%m-%d %H:%M:%S')"}
-                }
-            }
-        }
-        
         tools = [
             {'google_search': {}}, 
             {'code_execution': {}}, 
-            {"function_declarations": [
-                create_folder, create_file, edit_file, list_files, read_file, 
-                open_application, open_website, delete_file, search_files, 
-                rename_file, system_info, process_management, open_in_editor,
-                git_operations, system_notification, send_email, web_automation,
-                get_current_time
-            ]}
+            {"function_declarations": [spec.schema for spec in TOOL_REGISTRY.values()]}
         ]
         
         self.config = {
@@ -454,16 +2269,50 @@ class AI_Core(QObject):
             "tools": tools,
             "max_output_tokens": MAX_OUTPUT_TOKENS
         }
+        if CLIENT_VAD_ENABLED:
+            # Turns are delimited by our own activity markers instead of the server's detector
+            self.config["realtime_input_config"] = {"automatic_activity_detection": {"disabled": True}}
         self.session = None
         self.audio_stream = None
-        self.out_queue_gemini = asyncio.Queue(maxsize=20)
+        self.uplink = OutboundScheduler()
+        self.audio_batcher = AudioBatchController()
+        self.response_queue_text = asyncio.Queue()
         self.response_queue_tts = asyncio.Queue()
+        self.tts_segmenter = TextSegmenter()
         self.audio_in_queue_player = asyncio.Queue()
+        self.audio_output = AudioOutputEngine()
+        self.vad = VoiceActivityDetector() if CLIENT_VAD_ENABLED else None
+        self.tts_turn_task = None
+        self.turn_active = False        # receive_text is in the middle of a model turn
+        self.suppress_turn = False      # Drop the rest of an interrupted model turn
+        self.loud_mic_chunks = 0
+        self.interruptions = 0
+        self.last_interrupt_ms = None
         self.text_input_queue = asyncio.Queue()
-        self.latest_frame = None
+        self.capture = CaptureManager(self.screen_capture, self._emit_display_frame)
+        self.frame_gate = FrameChangeDetector()
+        self.frame_encoder = FrameEncoder()
+        self.video_controller = VideoUploadController()
         self.tasks = []
+        self.tool_executor = ToolExecutor()
+        self.pending_tool_calls = {}
+        self.tool_batches = set()
+        self.metrics_sampler = SystemMetricsSampler(on_alert=self.system_alert.emit)
+        self.metrics_sampler.start()
+        self.search_indexes = {}
+        self.search_index_lock = threading.Lock()
+        self.tool_cache = ToolResultCache()
+        tts_uri = f"wss://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream-input?model_id={TTS_MODEL_ID}&output_format=pcm_{RECEIVE_SAMPLE_RATE}&inactivity_timeout={TTS_INACTIVITY_TIMEOUT}"
+        self.tts_connections = TTSConnectionManager(tts_uri, json.dumps({"text": " ", "voice_settings": TTS_VOICE_SETTINGS, "xi_api_key": ELEVENLABS_API_KEY}))
+        self.speech_cache = SpeechCache()
+        self.fs_watcher = start_fs_watcher(os.getcwd(), self._on_paths_changed) if FS_WATCH_ENABLED else None
+        self.turn_file_list = None
         self.loop = asyncio.new_event_loop()
 
+    @tool("Creates a new folder at the specified path relative to the script's root directory.",
+          properties={"folder_path": {"type": "STRING", "description": "The path for the new folder (e.g., 'new_project/assets')."}},
+          required=["folder_path"],
+          timeout=10, mutating=True, idempotent=True)
     def _create_folder(self, folder_path):
         try:
             if not folder_path or not isinstance(folder_path, str): return {"status": "error", "message": "Invalid folder path provided."}
@@ -472,6 +2321,12 @@ class AI_Core(QObject):
             return {"status": "success", "message": f"Successfully created the folder at '{folder_path}'."}
         except Exception as e: return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
+    @tool("Creates a new file with specified content at a given path.",
+          properties={
+              "file_path": {"type": "STRING", "description": "The path for the new file (e.g., 'new_project/notes.txt')."},
+              "content": {"type": "STRING", "description": "The content to write into the new file."}},
+          required=["file_path", "content"],
+          timeout=10, mutating=True)
     def _create_file(self, file_path, content):
         try:
             if not file_path or not isinstance(file_path, str): return {"status": "error", "message": "Invalid file path provided."}
@@ -480,6 +2335,12 @@ class AI_Core(QObject):
             return {"status": "success", "message": f"Successfully created the file at '{file_path}'."}
         except Exception as e: return {"status": "error", "message": f"An error occurred while creating the file: {str(e)}"}
 
+    @tool("Appends content to an existing file at a specified path.",
+          properties={
+              "file_path": {"type": "STRING", "description": "The path of the file to edit (e.g., 'project/notes.txt')."},
+              "content": {"type": "STRING", "description": "The content to append to the file."}},
+          required=["file_path", "content"],
+          timeout=10, mutating=True)
     def _edit_file(self, file_path, content):
         try:
             if not file_path or not isinstance(file_path, str): return {"status": "error", "message": "Invalid file path provided."}
@@ -488,7 +2349,10 @@ class AI_Core(QObject):
             return {"status": "success", "message": f"Successfully appended content to the file at '{file_path}'."}
         except Exception as e: return {"status": "error", "message": f"An error occurred while editing the file: {str(e)}"}
 
-    def _list_files(self, directory_path):
+    @tool("Lists all files and directories within a specified folder. Defaults to the current directory if no path is provided.",
+          properties={"directory_path": {"type": "STRING", "description": "The path of the directory to inspect. Defaults to '.' (current directory) if omitted."}},
+          timeout=10, cacheable=True, idempotent=True, default_path=".")
+    def _list_files(self, directory_path=None):
         try:
             path_to_list = directory_path if directory_path else '.'
             if not isinstance(path_to_list, str): return {"status": "error", "message": "Invalid directory path provided."}
@@ -497,15 +2361,71 @@ class AI_Core(QObject):
             return {"status": "success", "message": f"Found {len(files)} items in '{path_to_list}'.", "files": files, "directory_path": path_to_list}
         except Exception as e: return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
-    def _read_file(self, file_path):
+    @tool("Reads a file, or part of it. Long results are cut to a size budget and return next_offset (and next_length for bounded reads) to continue from.",
+          properties={
+              "file_path": {"type": "STRING", "description": "The path of the file to read (e.g., 'project/notes.txt')."},
+              "offset": {"type": "INTEGER", "description": "Byte offset to start reading at (e.g., a previous next_offset)."},
+              "length": {"type": "INTEGER", "description": "Maximum number of bytes to read from offset (e.g., a previous next_length)."},
+              "start_line": {"type": "INTEGER", "description": "First line to read (1-based)."},
+              "end_line": {"type": "INTEGER", "description": "Last line to read (inclusive)."},
+              "mode": {"type": "STRING", "description": "full|head|tail. head and tail return the first or last `lines` lines."},
+              "lines": {"type": "INTEGER", "description": f"Line count for head/tail (default {READ_FILE_DEFAULT_LINES})."}},
+          required=["file_path"],
+          timeout=10, cacheable=True, idempotent=True)
+    def _read_file(self, file_path, offset=None, length=None, start_line=None, end_line=None, mode="full", lines=READ_FILE_DEFAULT_LINES):
         try:
             if not file_path or not isinstance(file_path, str): return {"status": "error", "message": "Invalid file path provided."}
             if not os.path.exists(file_path): return {"status": "error", "message": f"The file '{file_path}' does not exist."}
             if not os.path.isfile(file_path): return {"status": "error", "message": f"The path '{file_path}' is not a file."}
-            with open(file_path, 'r') as f: content = f.read()
-            return {"status": "success", "message": f"Successfully read the file '{file_path}'.", "content": content}
+            with open(file_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # Large files are mapped, so only the returned slice is ever copied
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= SEARCH_MMAP_MIN_BYTES else f.read()
+                try:
+                    if start_line or end_line:
+                        start = line_start_offset(buffer, max(int(start_line or 1), 1))
+                        end = line_start_offset(buffer, int(end_line) + 1) if end_line else size
+                    elif mode == "head":
+                        start, end = 0, line_start_offset(buffer, int(lines) + 1)
+                    elif mode == "tail":
+                        start, end = tail_start_offset(buffer, int(lines)), size
+                    else:
+                        start = min(max(int(offset or 0), 0), size)
+                        end = min(start + int(length), size) if length else size
+                    end = max(end, start)
+
+                    stop = min(end, start + READ_FILE_MAX_BYTES)
+                    if stop < end:
+                        # Cut at a line break if there is one, else on a UTF-8 character boundary
+                        newline = buffer.rfind(b"\n", start, stop)
+                        if newline >= 0: stop = newline + 1
+                        else:
+                            while stop > start and buffer[stop] & 0xC0 == 0x80: stop -= 1
+                    content = buffer[start:stop].decode('utf-8', errors='replace')
+                finally:
+                    if isinstance(buffer, mmap.mmap): buffer.close()
+
+            result = {"status": "success", "content": content, "start_offset": start, "end_offset": stop, "total_bytes": size}
+            if stop < end:
+                # The continuation keeps the original bound, so a cut ranged, line or head read doesn't run on to EOF
+                result["truncated"] = True
+                result["next_offset"] = stop
+                continuation = f"offset={stop}"
+                if end < size:
+                    result["next_length"] = end - stop
+                    continuation += f", length={end - stop}"
+                result["message"] = f"Read bytes {start}-{stop} of {size} from '{file_path}'. The rest was cut to fit the response; read again with {continuation} to continue."
+            elif start > 0 or stop < size:
+                result["message"] = f"Read bytes {start}-{stop} of {size} from '{file_path}'."
+            else:
+                result["message"] = f"Successfully read the file '{file_path}'."
+            return result
         except Exception as e: return {"status": "error", "message": f"An error occurred while reading the file: {str(e)}"}
 
+    @tool("Opens or launches a desktop application on the user's computer.",
+          properties={"application_name": {"type": "STRING", "description": "The name of the application to open (e.g., 'Notepad', 'Calculator', 'Chrome')."}},
+          required=["application_name"],
+          timeout=10)
     def _open_application(self, application_name):
         print(f">>> [DEBUG] Attempting to open application: '{application_name}'")
         try:
@@ -527,6 +2447,10 @@ class AI_Core(QObject):
         except FileNotFoundError: return {"status": "error", "message": f"Application '{application_name}' not found."}
         except Exception as e: return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
+    @tool("Opens a given URL in the default web browser.",
+          properties={"url": {"type": "STRING", "description": "The full URL of the website to open (e.g., 'https://www.google.com')."}},
+          required=["url"],
+          timeout=10)
     def _open_website(self, url):
         print(f">>> [DEBUG] Attempting to open URL: '{url}'")
         try:
@@ -537,6 +2461,12 @@ class AI_Core(QObject):
         except Exception as e: return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
     # Enhanced JARVIS-like functions
+    @tool("Deletes a file or directory at the specified path.",
+          properties={
+              "path": {"type": "STRING", "description": "The path to delete"},
+              "force": {"type": "BOOLEAN", "description": "Force deletion if True"}},
+          required=["path"],
+          timeout=30, mutating=True)
     def _delete_file(self, path, force=False):
         """Enhanced file deletion with safety checks"""
         try:
@@ -556,35 +2486,119 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Deletion failed: {str(e)}"}
 
-    def _search_files(self, search_term, file_pattern="*", directory="."):
-        """Advanced file content searching"""
+    @tool("Searches for files containing specific text or matching patterns. Returns matching line numbers and snippets.",
+          properties={
+              "search_term": {"type": "STRING", "description": "Text to search for"},
+              "file_pattern": {"type": "STRING", "description": "File pattern (e.g., *.py)"},
+              "directory": {"type": "STRING", "description": "Directory to search in"},
+              "regex": {"type": "BOOLEAN", "description": "Treat search_term as a regular expression"},
+              "max_results": {"type": "INTEGER", "description": f"Stop after this many matching files (default {SEARCH_MAX_RESULTS})"}},
+          required=["search_term"],
+          timeout=120, cacheable=True, idempotent=True, default_path=".", recursive=True)
+    async def _search_files(self, search_term, file_pattern="*", directory=".", regex=False, max_results=SEARCH_MAX_RESULTS):
+        """Indexed file content searching, with a parallel scan where there is no ready index"""
         try:
-            import fnmatch
+            if not search_term or not isinstance(search_term, str): return {"status": "error", "message": "Invalid search term provided."}
+            if not os.path.isdir(directory): return {"status": "error", "message": f"The path '{directory}' is not a valid directory."}
+            root = os.path.abspath(directory)
+            executor = self.tool_executor
+            # The index lookup and candidate check can wait on the index lock, so they stay off the loop
+            hits = await asyncio.get_running_loop().run_in_executor(
+                executor.thread_pool, self._search_index, search_term, file_pattern, root, regex, max_results)
+            if hits is None:
+                # The index is still building, or the tree is too large or excluded from one
+                hits = await scan_tree_parallel(search_term, file_pattern, root, regex, max_results, executor.process_pool, executor.thread_pool)
             results = []
-            
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    if fnmatch.fnmatch(file, file_pattern):
-                        file_path = os.path.join(root, file)
-                        try:
-                            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read()
-                                if search_term.lower() in content.lower():
-                                    results.append({
-                                        'file': file_path,
-                                        'matches': content.lower().count(search_term.lower())
-                                    })
-                        except:
-                            continue
-            
+            for result in hits:
+                result["file"] = os.path.join(directory, os.path.relpath(result["file"], root))
+                results.append(result)
+            results.sort(key=lambda r: r["file"])
             return {
-                "status": "success", 
-                "message": f"Found {len(results)} files containing '{search_term}'",
+                "status": "success",
+                "message": f"Found {len(results)} files containing '{search_term}'" + (" (stopped at max_results)" if len(results) >= max_results else ""),
                 "results": results
             }
+        except re.error as e:
+            return {"status": "error", "message": f"Invalid regular expression: {str(e)}"}
         except Exception as e:
             return {"status": "error", "message": f"Search failed: {str(e)}"}
 
+    def _search_index(self, search_term, file_pattern, root, regex, max_results):
+        """Hits from the ready index covering root, or None if there is none to ask."""
+        index = self._get_search_index(root)
+        if index is None or not index.ready: return None
+        # Without a watcher, edits made outside Ada only show up in a sweep
+        if not self._is_watched(index.root): index.sync()
+        if not index.ready: return None
+        # Candidates are few; checking them inline beats shipping them to workers
+        candidates = [path for path in index.candidates(search_term, regex) if paths_overlap(path, root)]
+        return list(scan_tree(search_term, file_pattern, regex=regex, max_results=max_results, file_paths=candidates))
+
+    def _ready_search_index(self, root):
+        """A ready index of root or an enclosing tree that doesn't exclude root, if there is one."""
+        for index in list(self.search_indexes.values()):
+            if index.ready and index.covers(root): return index
+        return None
+
+    def _get_search_index(self, root):
+        """
+        The index covering root: a ready index of an enclosing tree, or its own,
+        started on first use. None if root is too large to index or lies in a
+        directory an enclosing index leaves out, such as node_modules.
+        """
+        with self.search_index_lock:
+            index = self._ready_search_index(root)
+            if index is not None: return index
+            for other in list(self.search_indexes.values()):
+                if paths_overlap(root, other.root) and len(root) > len(other.root) and not is_searchable(other.root, root): return None
+            index = self.search_indexes.get(root)
+            if index is None:
+                index = self.search_indexes[root] = TrigramIndex(root)
+                index.start()
+            return None if index.oversized else index
+
+    def _on_paths_changed(self, paths):
+        """Called after a mutating tool succeeds (or the watcher sees a change), so derived state doesn't go stale."""
+        for path in paths:
+            self.tool_cache.invalidate(path)
+            for index_root, index in list(self.search_indexes.items()):
+                if paths_overlap(path, index_root): index.notify_changed(path)
+
+    def _is_watched(self, root):
+        """Whether the file watcher reports changes anywhere under root."""
+        watcher = self.fs_watcher
+        return (watcher is not None and watcher.observer is not None
+                and paths_overlap(root, watcher.directory) and len(root) >= len(watcher.directory))
+
+    def _cache_validator(self, spec, paths):
+        """What a cached result of this call must still match, or None if it can't be cached."""
+        try:
+            if spec.recursive:
+                # A directory stat misses edits deeper in the tree; the search index tracks those,
+                # but only promptly where the watcher reports them
+                index = self._ready_search_index(paths[0]) if len(paths) == 1 else None
+                return (index.root, index.generation) if index and self._is_watched(index.root) else None
+            return tuple(path_signature(path) for path in paths) or None
+        except OSError:
+            return None
+
+    def _runtime_stats(self):
+        """Internal counters, reported alongside system_info."""
+        return {"tool_cache": self.tool_cache.stats(), "tts_connections": self.tts_connections.stats(),
+                "speech_cache": self.speech_cache.stats(), "audio_output": self.audio_output.stats(),
+                "barge_in": {"interruptions": self.interruptions, "last_interrupt_ms": self.last_interrupt_ms},
+                "vad": self.vad.stats() if self.vad else None, "uplink": self.uplink.stats(),
+                "audio_batching": self.audio_batcher.stats(),
+                "frame_gate": self.frame_gate.stats(), "frame_encoder": self.frame_encoder.stats(),
+                "video_upload": self.video_controller.stats(),
+                "capture": self.capture.stats()}
+
+    @tool("Renames or moves a file/directory.",
+          properties={
+              "old_path": {"type": "STRING", "description": "Current path"},
+              "new_path": {"type": "STRING", "description": "New path"}},
+          required=["old_path", "new_path"],
+          timeout=10, mutating=True)
     def _rename_file(self, old_path, new_path):
         """Renames or moves files/directories"""
         try:
@@ -596,37 +2610,37 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Rename failed: {str(e)}"}
 
-    def _system_info(self):
-        """Comprehensive system monitoring"""
+    @tool("Gets detailed system information (CPU, memory, disk, network).",
+          properties={"window_seconds": {"type": "INTEGER", "description": "Optional: also return min/avg/max over the last N seconds"}},
+          blocking=False, idempotent=True)
+    def _system_info(self, window_seconds=None):
+        """Comprehensive system monitoring, answered from the background sampler"""
         try:
+            snapshot = self.metrics_sampler.latest() or self.metrics_sampler.sample_now()
             info = {
-                "system": platform.system(),
-                "processor": platform.processor(),
-                "cpu_usage": psutil.cpu_percent(interval=1),
-                "memory": {
-                    "total": psutil.virtual_memory().total,
-                    "available": psutil.virtual_memory().available,
-                    "percent": psutil.virtual_memory().percent
-                },
-                "disk": {
-                    "total": psutil.disk_usage('/').total,
-                    "free": psutil.disk_usage('/').free,
-                    "percent": psutil.disk_usage('/').percent
-                }
+                "system": self.metrics_sampler.platform.get("system", platform.system()),
+                "processor": self.metrics_sampler.platform.get("processor", ""),
+                "cpu_usage": snapshot["cpu_usage"],
+                "cpu_per_core": snapshot["cpu_per_core"],
+                "memory": snapshot["memory"],
+                "disk": snapshot["disk"],
+                "network": snapshot["network"],
+                "sampled_at": datetime.datetime.fromtimestamp(snapshot["timestamp"]).isoformat()
             }
-            
-            # Alert if system resources are critical
-            if info["memory"]["percent"] > 90:
-                self.system_alert.emit("CRITICAL", f"Memory usage at {info['memory']['percent']}%")
-            if info["disk"]["percent"] > 95:
-                self.system_alert.emit("CRITICAL", f"Disk usage at {info['disk']['percent']}%")
-            if info["cpu_usage"] > 90:
-                self.system_alert.emit("WARNING", f"CPU usage at {info['cpu_usage']}%")
-            
+            if window_seconds:
+                info["window"] = self.metrics_sampler.window_stats(window_seconds)
+            info["assistant"] = self._runtime_stats()
             return {"status": "success", "message": "System information retrieved", "data": info}
         except Exception as e:
             return {"status": "error", "message": f"System info failed: {str(e)}"}
 
+    @tool("Lists, starts, or stops system processes.",
+          properties={
+              "action": {"type": "STRING", "description": "list|start|stop|kill"},
+              "process_name": {"type": "STRING", "description": "Process to act on"},
+              "process_id": {"type": "INTEGER", "description": "PID for stop/kill"}},
+          required=["action"],
+          timeout=10)
     def _process_management(self, action, process_name=None, process_id=None):
         """Manage system processes"""
         try:
@@ -654,6 +2668,12 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Process management failed: {str(e)}"}
 
+    @tool("Opens a file in the default or specified code editor.",
+          properties={
+              "file_path": {"type": "STRING", "description": "File to open"},
+              "editor": {"type": "STRING", "description": "Specific editor (vscode, sublime, etc.)"}},
+          required=["file_path"],
+          timeout=10)
     def _open_in_editor(self, file_path, editor="default"):
         """Open files in specific code editors"""
         try:
@@ -674,6 +2694,13 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Failed to open editor: {str(e)}"}
 
+    @tool("Performs Git operations (commit, push, pull, status).",
+          properties={
+              "operation": {"type": "STRING", "description": "status|commit|push|pull|log"},
+              "message": {"type": "STRING", "description": "Commit message"},
+              "files": {"type": "STRING", "description": "Specific files to commit"}},
+          required=["operation"],
+          timeout=60, mutating=True, default_path=".")
     def _git_operations(self, operation, message="", files=""):
         """Git version control operations"""
         try:
@@ -697,36 +2724,52 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Git operation failed: {str(e)}"}
 
-        def _system_notification(self, title, message, urgency="normal"):
-            try:
+    @tool("Shows desktop notifications.",
+          properties={
+              "title": {"type": "STRING", "description": "Notification title"},
+              "message": {"type": "STRING", "description": "Notification message"},
+              "urgency": {"type": "STRING", "description": "low|normal|critical"}},
+          required=["title", "message"],
+          timeout=10)
+    def _system_notification(self, title, message, urgency="normal"):
+        """Show a desktop notification"""
+        try:
             # Try plyer first (recommended)
-                try:
-                    from plyer import notification
-                    notification.notify(
-                        title=title,
-                        message=message,
-                        timeout=5,
-                        app_name="A.D.A. Assistant",
-                        app_icon=None  # You can add an icon path here
-                    )
-                except ImportError:
-                    # Fallback to platform-specific methods
-                    if sys.platform == "win32":
-                        try:
-                            from win10toast import ToastNotifier
-                            toaster = ToastNotifier()
-                            toaster.show_toast(title, message, duration=5)
-                        except ImportError:
-                            subprocess.Popen(["msg", "*", f"{title}: {message}"])
-                    elif sys.platform == "darwin":
-                        subprocess.Popen(["osascript", "-e", f'display notification "{message}" with title "{title}"'])
-                    else:
-                        subprocess.Popen(["notify-send", title, message, f"--urgency={urgency}"])
-            
-                    return {"status": "success", "message": "Notification sent"}
-            except Exception as e:
-                return {"status": "error", "message": f"Notification failed: {str(e)}"}
+            try:
+                from plyer import notification
+                notification.notify(
+                    title=title,
+                    message=message,
+                    timeout=5,
+                    app_name="A.D.A. Assistant",
+                    app_icon=None  # You can add an icon path here
+                )
+            except ImportError:
+                # Fallback to platform-specific methods
+                if sys.platform == "win32":
+                    try:
+                        from win10toast import ToastNotifier
+                        toaster = ToastNotifier()
+                        toaster.show_toast(title, message, duration=5)
+                    except ImportError:
+                        subprocess.Popen(["msg", "*", f"{title}: {message}"])
+                elif sys.platform == "darwin":
+                    subprocess.Popen(["osascript", "-e", f'display notification "{message}" with title "{title}"'])
+                else:
+                    subprocess.Popen(["notify-send", title, message, f"--urgency={urgency}"])
 
+            return {"status": "success", "message": "Notification sent"}
+        except Exception as e:
+            return {"status": "error", "message": f"Notification failed: {str(e)}"}
+
+    @tool("Sends emails via SMTP.",
+          properties={
+              "recipient": {"type": "STRING", "description": "Email address"},
+              "subject": {"type": "STRING", "description": "Email subject"},
+              "body": {"type": "STRING", "description": "Email content"},
+              "attachments": {"type": "STRING", "description": "Files to attach"}},
+          required=["recipient", "subject", "body"],
+          timeout=30)
     def _send_email(self, recipient, subject, body, attachments=""):
         """Send email via SMTP"""
         try:
@@ -760,6 +2803,13 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Email failed: {str(e)}"}
 
+    @tool("Automates web browsing tasks.",
+          properties={
+              "action": {"type": "STRING", "description": "screenshot|extract_data|fill_form"},
+              "url": {"type": "STRING", "description": "Website URL"},
+              "data": {"type": "STRING", "description": "Data to extract or form data"}},
+          required=["action", "url"],
+          timeout=20)
     def _web_automation(self, action, url, data=""):
         """Basic web automation"""
         try:
@@ -776,6 +2826,12 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Web automation failed: {str(e)}"}
 
+    @tool("Gets the current date and time from the user's computer in various formats.",
+          properties={
+              "format": {"type": "STRING", "description": "Format type: 'full', 'time', 'date', 'timestamp', 'iso', 'custom'"},
+              "timezone": {"type": "STRING", "description": "Timezone (e.g., 'UTC', 'local', 'US/Eastern')"},
+              "custom_format": {"type": "STRING", "description": "Custom strftime format string (e.g., '%Y-%m-%d %H:%M:%S')"}},
+          blocking=False, idempotent=True)
     def _get_current_time(self, format="full", timezone="local", custom_format=""):
         """Get current date and time in various formats"""
         try:
@@ -834,122 +2890,180 @@ class AI_Core(QObject):
         except Exception as e:
             return {"status": "error", "message": f"Time retrieval failed: {str(e)}"}
 
+    @tool("Chooses which part of the screen is shared in screen mode: the whole desktop, one monitor, one window, or a rectangle. Capturing only the relevant region gives sharper, smaller frames.",
+          properties={"region": {"type": "STRING", "description": "'all', 'monitor:<n>' (1 is the primary monitor), 'window:<title substring>' or 'rect:<left>,<top>,<width>,<height>' in screen pixels."}},
+          required=["region"],
+          timeout=10)
+    def _set_screen_region(self, region):
+        try:
+            bbox = self.screen_capture.set_region(region)
+            return {"status": "success", "message": f"Screen capture region set to '{region}'.", "bbox": bbox}
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        except Exception as e:
+            return {"status": "error", "message": f"Could not set screen region: {str(e)}"}
+
     @Slot(str)
     def set_video_mode(self, mode):
         """Sets the video source and notifies the GUI."""
         if mode in ["camera", "screen", "none"]:
             self.video_mode = mode
             print(f">>> [INFO] Switched video mode to: {self.video_mode}")
-            if mode == "none":
-                self.latest_frame = None
+            self.capture.switch(mode)
+            if mode == "none": self.frame_received.emit(QImage(), -1)
             self.video_mode_changed.emit(mode)
 
-    async def stream_video_to_gui(self):
-        video_capture = None
-        while self.is_running:
-            frame = None
-            try:
-                if self.video_mode == "camera":
-                    if video_capture is None: video_capture = await asyncio.to_thread(cv2.VideoCapture, 0)
-                    if video_capture.isOpened():
-                        ret, frame = await asyncio.to_thread(video_capture.read)
-                        if not ret:
-                            await asyncio.sleep(0.01)
-                            continue
-                elif self.video_mode == "screen":
-                    if video_capture is not None:
-                        await asyncio.to_thread(video_capture.release)
-                        video_capture = None
-                    screenshot = await asyncio.to_thread(ImageGrab.grab)
-                    frame = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-                else:
-                    if video_capture is not None:
-                        await asyncio.to_thread(video_capture.release)
-                        video_capture = None
-                    await asyncio.sleep(0.1)
-                    continue
-                if frame is not None:
-                    self.latest_frame = frame
-                    h, w, ch = frame.shape
-                    bytes_per_line = ch * w
-                    qt_image = QImage(frame.data, w, h, bytes_per_line, QImage.Format_BGR888)
-                    self.frame_received.emit(qt_image.copy())
-                else: self.frame_received.emit(QImage())
-                await asyncio.sleep(0.033)
-            except Exception as e:
-                print(f">>> [ERROR] Video streaming error: {e}")
-                if video_capture is not None:
-                    await asyncio.to_thread(video_capture.release)
-                    video_capture = None
-                await asyncio.sleep(1)
-        if video_capture is not None: await asyncio.to_thread(video_capture.release)
+    def _emit_display_frame(self, token, frame):
+        """Wraps a pooled preview frame without copying; the GUI releases it once drawn."""
+        h, w, ch = frame.shape
+        self.frame_received.emit(QImage(frame.data, w, h, ch * w, QImage.Format_BGR888), token)
+
+    def set_display_size(self, width, height):
+        self.capture.set_display_size(width, height)
+
+    def release_frame(self, token):
+        if token >= 0: self.capture.release_display_frame(token)
 
     async def send_frames_to_gemini(self):
+        last_seq = None
         while self.is_running:
-            await asyncio.sleep(1.0)
-            if self.video_mode != "none" and self.latest_frame is not None:
-                frame_rgb = cv2.cvtColor(self.latest_frame, cv2.COLOR_BGR2RGB)
-                pil_img = PIL.Image.fromarray(frame_rgb)
-                pil_img.thumbnail([1024, 1024])
-                image_io = io.BytesIO()
-                pil_img.save(image_io, format="jpeg")
-                gemini_data = {"mime_type": "image/jpeg", "data": base64.b64encode(image_io.getvalue()).decode()}
-                await self.out_queue_gemini.put(gemini_data)
+            await asyncio.sleep(1.0 / self.video_controller.fps())
+            if self.video_mode == "none": continue
+            with self.capture.read() as (seq, frame):
+                if frame is None or seq == last_seq: continue
+                last_seq = seq
+                self.video_controller.update(self.uplink.stats())
+                changed, score = await asyncio.to_thread(self.frame_gate.check, frame, self.video_mode)
+                self.video_controller.record_diff(score, self.video_mode)
+                if not changed: continue
+                jpeg = await self.frame_encoder.encode_async(frame, max_dimension=self.video_controller.max_dimension(),
+                                                             quality=self.video_controller.quality())
+            self.uplink.put_nowait("video", {"mime_type": "image/jpeg", "data": jpeg})
+
+    async def _run_tool_call(self, fc, spec, kwargs, paths, depends_on):
+        """Runs a single function call once the calls it conflicts with have finished."""
+        if depends_on: await asyncio.gather(*depends_on, return_exceptions=True)
+        if spec is None:
+            return {"status": "error", "message": f"Function '{fc.name}' is not available."}
+        cache_key = validator = None
+        if spec.cacheable:
+            # Taken before the tool runs, so a change made during the call invalidates its result
+            validator = self._cache_validator(spec, paths)
+            if validator is not None:
+                cache_key = (spec.name, json.dumps(kwargs, sort_keys=True, default=str))
+                cached = self.tool_cache.get(cache_key, validator)
+                if cached is not None: return cached
+        try:
+            result = await self.tool_executor.execute(spec, self, kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"status": "error", "message": f"Tool execution failed: {str(e)}"}
+        if result.get("status") == "success":
+            if spec.mutating: self._on_paths_changed(paths)
+            if cache_key: self.tool_cache.put(cache_key, validator, paths, result)
+        return result
+
+    @staticmethod
+    def _tool_call_waiter(execution, waiters):
+        """
+        Gives one function call id its own handle on a possibly shared execution,
+        so cancelling that id leaves the other callers untouched. The execution
+        itself is cancelled once every id waiting on it is.
+        """
+        waiter = asyncio.ensure_future(asyncio.shield(execution))
+        waiters.append(waiter)
+        def on_done(done):
+            if done.cancelled() and all(other.cancelled() for other in waiters): execution.cancel()
+        waiter.add_done_callback(on_done)
+        return waiter
+
+    async def _run_tool_calls(self, function_calls):
+        """
+        Fans one tool_call chunk out concurrently and sends the responses back in
+        the original order. A call that overlaps the path of an earlier call, where
+        either of them writes, waits for that earlier call to finish first.
+        Identical calls to an idempotent tool share one execution, unless a write
+        to an overlapping path was queued between them.
+        """
+        tasks, executions, footprints, shared = [], [], [], {}
+        try:
+            for fc in function_calls:
+                spec = TOOL_REGISTRY.get(fc.name)
+                kwargs = spec.build_kwargs(fc.args or {}) if spec else {}
+                paths = tool_call_paths(spec, fc.args or {}) if spec else []
+                mutating = bool(spec and spec.mutating)
+                key = (fc.name, json.dumps(kwargs, sort_keys=True, default=str))
+                if spec and spec.idempotent and key in shared:
+                    execution, waiters, _ = shared[key]
+                else:
+                    depends_on = [other for other, (other_paths, other_mutating) in zip(executions, footprints)
+                                  if (mutating or other_mutating) and any(paths_overlap(a, b) for a in paths for b in other_paths)]
+                    execution, waiters = asyncio.create_task(self._run_tool_call(fc, spec, kwargs, paths, depends_on)), []
+                    executions.append(execution); footprints.append((paths, mutating))
+                    if mutating:
+                        # Later calls on these paths must run after this write rather than reuse an earlier result
+                        shared = {k: v for k, v in shared.items() if not any(paths_overlap(a, b) for a in paths for b in v[2])}
+                    if spec and spec.idempotent: shared[key] = (execution, waiters, paths)
+                task = self._tool_call_waiter(execution, waiters)
+                self.pending_tool_calls[fc.id] = task
+                tasks.append(task)
+
+            outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+            function_responses = []
+            for fc, result in zip(function_calls, outcomes):
+                # Calls cancelled by the server expect no response
+                if not isinstance(result, dict): continue
+                if fc.name == "list_files" and result.get("status") == "success": self.turn_file_list = (result.get("directory_path"), result.get("files"))
+                function_responses.append({"id": fc.id, "name": fc.name, "response": result})
+            if function_responses:
+                await self.session.send_tool_response(function_responses=function_responses)
+        except asyncio.CancelledError:
+            for task in tasks + executions: task.cancel()
+        except Exception:
+            if self.is_running: traceback.print_exc()
+        finally:
+            for fc in function_calls: self.pending_tool_calls.pop(fc.id, None)
 
     async def receive_text(self):
         while self.is_running:
             try:
-                turn_urls, turn_code_content, turn_code_result, file_list_data = set(), "", "", None
+                turn_urls, turn_code_content, turn_code_result = set(), "", ""
+                self.turn_file_list = None
                 turn = self.session.receive()
                 async for chunk in turn:
                     if chunk.tool_call and chunk.tool_call.function_calls:
-                        function_responses = []
-                        for fc in chunk.tool_call.function_calls:
-                            args, result = fc.args, {}
-                            # Original functions
-                            if fc.name == "create_folder": result = self._create_folder(folder_path=args.get("folder_path"))
-                            elif fc.name == "create_file": result = self._create_file(file_path=args.get("file_path"), content=args.get("content"))
-                            elif fc.name == "edit_file": result = self._edit_file(file_path=args.get("file_path"), content=args.get("content"))
-                            elif fc.name == "list_files":
-                                result = self._list_files(directory_path=args.get("directory_path"))
-                                if result.get("status") == "success": file_list_data = (result.get("directory_path"), result.get("files"))
-                            elif fc.name == "read_file": result = self._read_file(file_path=args.get("file_path"))
-                            elif fc.name == "open_application": result = self._open_application(application_name=args.get("application_name"))
-                            elif fc.name == "open_website": result = self._open_website(url=args.get("url"))
-                            # Enhanced functions
-                            elif fc.name == "delete_file": result = self._delete_file(path=args.get("path"), force=args.get("force", False))
-                            elif fc.name == "search_files": result = self._search_files(search_term=args.get("search_term"), file_pattern=args.get("file_pattern", "*"), directory=args.get("directory", "."))
-                            elif fc.name == "rename_file": result = self._rename_file(old_path=args.get("old_path"), new_path=args.get("new_path"))
-                            elif fc.name == "system_info": result = self._system_info()
-                            elif fc.name == "process_management": result = self._process_management(action=args.get("action"), process_name=args.get("process_name"), process_id=args.get("process_id"))
-                            elif fc.name == "open_in_editor": result = self._open_in_editor(file_path=args.get("file_path"), editor=args.get("editor", "default"))
-                            elif fc.name == "git_operations": result = self._git_operations(operation=args.get("operation"), message=args.get("message", ""), files=args.get("files", ""))
-                            elif fc.name == "system_notification": result = self._system_notification(title=args.get("title"), message=args.get("message"), urgency=args.get("urgency", "normal"))
-                            elif fc.name == "send_email": result = self._send_email(recipient=args.get("recipient"), subject=args.get("subject"), body=args.get("body"), attachments=args.get("attachments", ""))
-                            elif fc.name == "web_automation": result = self._web_automation(action=args.get("action"), url=args.get("url"), data=args.get("data", ""))
-                            elif fc.name == "get_current_time": result = self._get_current_time(format=args.get("format", "full"), timezone=args.get("timezone", "local"), custom_format=args.get("custom_format", ""))
-                            
-                            function_responses.append({"id": fc.id, "name": fc.name, "response": result})
-                        await self.session.send_tool_response(function_responses=function_responses)
+                        # Tools run as a separate task so this loop keeps reading the
+                        # session and can act on a tool_call_cancellation for them.
+                        batch = asyncio.create_task(self._run_tool_calls(chunk.tool_call.function_calls))
+                        self.tool_batches.add(batch); batch.add_done_callback(self.tool_batches.discard)
+                        continue
+                    if chunk.tool_call_cancellation and chunk.tool_call_cancellation.ids:
+                        for call_id in chunk.tool_call_cancellation.ids:
+                            task = self.pending_tool_calls.pop(call_id, None)
+                            if task: task.cancel()
                         continue
                     if chunk.server_content:
                         if hasattr(chunk.server_content, 'grounding_metadata') and chunk.server_content.grounding_metadata:
                             for g_chunk in chunk.server_content.grounding_metadata.grounding_chunks:
                                 if g_chunk.web and g_chunk.web.uri: turn_urls.add(g_chunk.web.uri)
+                        if getattr(chunk.server_content, 'interrupted', False): self.interrupt("server")
                         if chunk.server_content.model_turn:
                             for part in chunk.server_content.model_turn.parts:
                                 if part.executable_code: turn_code_content = part.executable_code.code
                                 if part.code_execution_result: turn_code_result = part.code_execution_result.output
-                    if chunk.text:
+                    if chunk.text and not self.suppress_turn:
+                        self.turn_active = True
                         self.text_received.emit(chunk.text)
-                        await self.response_queue_tts.put(chunk.text)
-                if file_list_data: self.file_list_received.emit(file_list_data[0], file_list_data[1])
+                        await self.response_queue_text.put(chunk.text)
+                if self.turn_file_list: self.file_list_received.emit(self.turn_file_list[0], self.turn_file_list[1])
                 elif turn_code_content: self.code_being_executed.emit(turn_code_content, turn_code_result)
                 elif turn_urls: self.search_results_received.emit(list(turn_urls))
                 else:
                     self.code_being_executed.emit("",""); self.search_results_received.emit([]); self.file_list_received.emit("",[])
+                self.turn_active = self.suppress_turn = False
                 self.end_of_turn.emit()
-                await self.response_queue_tts.put(None)
+                await self.response_queue_text.put(None)
             except Exception:
                 if not self.is_running: break
                 traceback.print_exc()
@@ -960,14 +3074,32 @@ class AI_Core(QObject):
         while self.is_running:
             data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, exception_on_overflow=False)
             if not self.is_running: break
-            await self.out_queue_gemini.put({"data": data, "mime_type": "audio/pcm"})
+            rms, zcr = pcm_levels(data)
+            if BARGE_IN_ENABLED: self._check_barge_in(rms)
+            if self.vad is None:
+                self.uplink.put_nowait("audio", {"data": data, "mime_type": "audio/pcm"}); continue
+            echo_level = BARGE_IN_ECHO_RATIO * self.audio_output.level if self.assistant_speaking() else 0.0
+            for event, chunk in self.vad.process(data, rms, zcr, echo_level):
+                if event == "audio": self.uplink.put_nowait("audio", {"data": chunk, "mime_type": "audio/pcm"})
+                else: self.uplink.put_nowait("audio", {"activity": event})
 
     async def send_realtime(self):
         while self.is_running:
-            msg = await self.out_queue_gemini.get()
+            lane, msg = await self.uplink.get()
             if not self.is_running: break
-            await self.session.send(input=msg)
-            self.out_queue_gemini.task_done()
+            if lane == "control": await self.session.send_client_content(**msg)
+            elif "activity" in msg:
+                if msg["activity"] == "start": await self.session.send_realtime_input(activity_start=types.ActivityStart())
+                else: await self.session.send_realtime_input(activity_end=types.ActivityEnd())
+            elif lane == "audio":
+                more = self.uplink.take_more("audio", self.audio_batcher.limit - 1, lambda item: "data" in item)
+                data = b"".join([msg["data"]] + [item["data"] for item in more]) if more else msg["data"]
+                await self.session.send(input={"data": data, "mime_type": "audio/pcm"})
+                self.audio_batcher.record(1 + len(more), len(data), len(self.uplink.lanes["audio"]))
+            else:
+                started = time.monotonic()
+                await self.session.send(input=msg)
+                self.video_controller.record_send(time.monotonic() - started)
 
     async def process_text_input_queue(self):
         while self.is_running:
@@ -975,59 +3107,149 @@ class AI_Core(QObject):
             if text is None:
                 self.text_input_queue.task_done(); break
             if self.session:
-                for q in [self.response_queue_tts, self.audio_in_queue_player]:
-                    while not q.empty(): q.get_nowait()
-                await self.session.send_client_content(turns=[{"role": "user", "parts": [{"text": text or "."}]}])
+                self.interrupt("text")
+                await self.uplink.put("control", {"turns": [{"role": "user", "parts": [{"text": text or "."}]}]})
             self.text_input_queue.task_done()
 
+    def assistant_speaking(self):
+        return self.tts_turn_task is not None or self.turn_active or self.audio_output.count > 0
+
+    def _check_barge_in(self, rms):
+        """
+        Interrupts Ada once the mic has been loud for a few consecutive chunks
+        while she speaks. Loud means above the fixed threshold and above her own
+        playback level, which is what the mic hears of her through the speakers.
+        """
+        if not self.assistant_speaking():
+            self.loud_mic_chunks = 0; return
+        threshold = max(BARGE_IN_RMS_THRESHOLD, BARGE_IN_ECHO_RATIO * self.audio_output.level)
+        self.loud_mic_chunks = self.loud_mic_chunks + 1 if rms >= threshold else 0
+        if self.loud_mic_chunks >= BARGE_IN_MIN_CHUNKS:
+            self.loud_mic_chunks = 0
+            self.interrupt("voice")
+
+    def interrupt(self, reason):
+        """
+        Stops the current reply everywhere at once: the TTS socket task is
+        cancelled, queued text and audio are drained and the playback buffer is
+        cleared, so silence follows within one audio callback period. The Live
+        session learns of the interruption from the user's audio or text itself
+        and reports it back as interrupted. A local voice barge-in only silences
+        Ada; the rest of the model turn is dropped once the server confirms, so
+        a false trigger costs a phrase rather than the whole reply.
+        """
+        started = time.perf_counter()
+        active = self.assistant_speaking()
+        if self.turn_active and reason != "voice": self.suppress_turn = True
+        if self.tts_turn_task is not None: self.tts_turn_task.cancel()
+        for q in [self.response_queue_text, self.response_queue_tts, self.audio_in_queue_player]:
+            while not q.empty(): q.get_nowait()
+        self.tts_segmenter.reset()
+        self.audio_output.clear()
+        if active:
+            self.interruptions += 1
+            self.last_interrupt_ms = round((time.perf_counter() - started) * 1000, 2)
+            print(f">>> [INFO] Interrupted by {reason} in {self.last_interrupt_ms} ms")
+
+    async def segment_tts_text(self):
+        """Turns the raw text stream from receive_text into speakable segments for tts."""
+        while self.is_running:
+            timeout = self.tts_segmenter.time_until_due()
+            try:
+                text = await asyncio.wait_for(self.response_queue_text.get(), timeout)
+            except asyncio.TimeoutError:
+                for segment in self.tts_segmenter.flush_due(): await self.response_queue_tts.put(segment)
+                continue
+            if text is None:
+                for segment in self.tts_segmenter.flush(): await self.response_queue_tts.put(segment)
+                await self.response_queue_tts.put(None)
+            else:
+                for segment in self.tts_segmenter.feed(text): await self.response_queue_tts.put(segment)
+            self.response_queue_text.task_done()
+
     async def tts(self):
-        uri = f"wss://api.elevenlabs.io/v1/text-to-speech/{VOICE_ID}/stream-input?model_id=eleven_turbo_v2_5&output_format=pcm_24000"
+        """Speaks each reply as its own task, so interrupt() can cancel it mid-stream."""
+        self.tts_connections.start()
         while self.is_running:
             text_chunk = await self.response_queue_tts.get()
             if text_chunk is None or not self.is_running:
                 self.response_queue_tts.task_done(); continue
-            
-            self.speaking_started.emit()
-            try:
-                async with websockets.connect(uri) as websocket:
-                    await websocket.send(json.dumps({"text": " ", "voice_settings": {"stability": 0.5, "similarity_boost": 0.8}, "xi_api_key": ELEVENLABS_API_KEY,}))
-                    async def listen():
-                        while self.is_running:
-                            try:
-                                message = await websocket.recv()
-                                data = json.loads(message)
-                                if data.get("audio"): await self.audio_in_queue_player.put(base64.b64decode(data["audio"]))
-                                elif data.get("isFinal"): break
-                            except websockets.exceptions.ConnectionClosed: break
-                    listen_task = asyncio.create_task(listen())
-                    await websocket.send(json.dumps({"text": text_chunk + " "}))
-                    self.response_queue_tts.task_done()
-                    while self.is_running:
-                        text_chunk = await self.response_queue_tts.get()
-                        if text_chunk is None:
-                            await websocket.send(json.dumps({"text": ""}))
-                            self.response_queue_tts.task_done(); break
-                        await websocket.send(json.dumps({"text": text_chunk + " "}))
-                        self.response_queue_tts.task_done()
-                    await listen_task
-            except Exception as e: 
-                print(f">>> [ERROR] TTS Error: {e}")
-            finally:
-                self.speaking_stopped.emit()
+            self.response_queue_tts.task_done()
+            turn = self.tts_turn_task = asyncio.create_task(self._speak_reply(text_chunk))
+            try: await asyncio.wait({turn})
+            except asyncio.CancelledError:
+                turn.cancel(); raise
+            finally: self.tts_turn_task = None
+
+    async def _speak_reply(self, text_chunk):
+        """
+        Leading segments found in the speech cache are played straight from disk;
+        from the first miss on, the rest of the reply is streamed through an
+        ElevenLabs socket. Single-segment replies that were synthesized are
+        recorded into the cache.
+        """
+        self.speaking_started.emit()
+        websocket = listen_task = None
+        try:
+            while text_chunk is not None and self.is_running:
+                pcm = await asyncio.to_thread(self.speech_cache.get, text_chunk)
+                if pcm is None: break
+                await self.audio_in_queue_player.put(pcm)
+                text_chunk = await self.response_queue_tts.get()
+                self.response_queue_tts.task_done()
+            if text_chunk is None: return
+            segments = [text_chunk]
+            audio = []
+            websocket = await self.tts_connections.acquire()
+            async def listen():
+                while self.is_running:
+                    try:
+                        message = await websocket.recv()
+                        data = json.loads(message)
+                        if data.get("audio"):
+                            chunk = base64.b64decode(data["audio"])
+                            audio.append(chunk)
+                            await self.audio_in_queue_player.put(chunk)
+                        elif data.get("isFinal"): return True
+                    except websockets.exceptions.ConnectionClosed: break
+                return False
+            listen_task = asyncio.create_task(listen())
+            await websocket.send(json.dumps({"text": text_chunk + " "}))
+            while self.is_running:
+                text_chunk = await self.response_queue_tts.get()
+                self.response_queue_tts.task_done()
+                if text_chunk is None:
+                    await websocket.send(json.dumps({"text": ""})); break
+                segments.append(text_chunk)
+                await websocket.send(json.dumps({"text": text_chunk + " "}))
+            completed = await listen_task
+            if completed and len(segments) == 1 and self.speech_cache.cacheable(segments[0]):
+                await asyncio.to_thread(self.speech_cache.put, segments[0], b"".join(audio))
+        except asyncio.CancelledError:
+            pass  # Interrupted; the socket still has generation in flight, so it is closed below
+        except Exception as e: 
+            print(f">>> [ERROR] TTS Error: {e}")
+        finally:
+            if listen_task is not None: listen_task.cancel()
+            if websocket is not None: asyncio.create_task(websocket.close())
+            self.audio_in_queue_player.put_nowait(None)  # End of reply for the output buffer
+            self.speaking_stopped.emit()
 
     async def play_audio(self):
-        stream = await asyncio.to_thread(pya.open, format=pyaudio.paInt16, channels=CHANNELS, rate=RECEIVE_SAMPLE_RATE, output=True)
+        await asyncio.to_thread(self.audio_output.start)
         while self.is_running:
             bytestream = await self.audio_in_queue_player.get()
-            if bytestream and self.is_running: await asyncio.to_thread(stream.write, bytestream)
+            if bytestream is None: self.audio_output.mark_end()
+            elif self.is_running: await self.audio_output.write(bytestream)
             self.audio_in_queue_player.task_done()
 
     async def main_task_runner(self, session):
         self.session = session
+        self.capture.switch(self.video_mode)
         self.tasks.extend([
-            asyncio.create_task(self.stream_video_to_gui()), asyncio.create_task(self.send_frames_to_gemini()),
+            asyncio.create_task(self.send_frames_to_gemini()),
             asyncio.create_task(self.listen_audio()), asyncio.create_task(self.send_realtime()),
-            asyncio.create_task(self.receive_text()), asyncio.create_task(self.tts()),
+            asyncio.create_task(self.receive_text()), asyncio.create_task(self.segment_tts_text()), asyncio.create_task(self.tts()),
             asyncio.create_task(self.play_audio()), asyncio.create_task(self.process_text_input_queue())
         ])
         await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -1052,6 +3274,8 @@ class AI_Core(QObject):
     async def shutdown_async_tasks(self):
         if self.text_input_queue: await self.text_input_queue.put(None)
         for task in self.tasks: task.cancel()
+        for task in list(self.pending_tool_calls.values()): task.cancel()
+        await self.tts_connections.close()
         await asyncio.sleep(0.1)
 
     def stop(self):
@@ -1060,12 +3284,155 @@ class AI_Core(QObject):
             future = asyncio.run_coroutine_threadsafe(self.shutdown_async_tasks(), self.loop)
             try: future.result(timeout=5)
             except Exception as e: print(f">>> [ERROR] Timeout or error during async shutdown: {e}")
+        self.tool_executor.shutdown()
+        self.capture.stop()
+        self.frame_encoder.shutdown()
+        self.metrics_sampler.stop()
+        for index in self.search_indexes.values(): index.stop()
+        if self.fs_watcher: self.fs_watcher.stop()
+        print(f">>> [INFO] Tool cache: {self.tool_cache.stats()}")
+        print(f">>> [INFO] Speech cache: {self.speech_cache.stats()}")
+        print(f">>> [INFO] Audio output: {self.audio_output.stats()}")
+        self.audio_output.stop()
         if self.audio_stream and self.audio_stream.is_active():
             self.audio_stream.stop_stream(); self.audio_stream.close()
 
 # ==============================================================================
 # STYLED GUI APPLICATION
 # ==============================================================================
+class TranscriptView:
+    """
+    Drives the chat QTextEdit with constant per-frame cost. Streamed chunks
+    are buffered and inserted once per TRANSCRIPT_FLUSH_MS tick; the view
+    only follows new text while it is scrolled to the bottom. Once the
+    document passes TRANSCRIPT_MAX_BLOCKS, the oldest turns are appended to
+    a per-session JSONL archive and removed, and they are paged back in when
+    the user scrolls to the top.
+    """
+    def __init__(self, text_edit, archive_dir=TRANSCRIPT_DIR):
+        self.text_edit = text_edit
+        self.document = text_edit.document()
+        self.scrollbar = text_edit.verticalScrollBar()
+        self.turns = collections.deque()  # Displayed turns, oldest first: {"id", "role", "text", "start", "archived"}
+        self.next_id = 0
+        self.current = None               # The A.D.A. turn being streamed
+        self.pending = []
+        self.flush_timer = QTimer(text_edit)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(TRANSCRIPT_FLUSH_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        self.archive_offsets = []         # File offset of each archived turn, indexed by turn id
+        self.archive_path = None
+        try:
+            os.makedirs(archive_dir, exist_ok=True)
+            self.archive_path = os.path.join(archive_dir, datetime.datetime.now().strftime("transcript-%Y%m%d-%H%M%S.jsonl"))
+        except OSError as e:
+            print(f">>> [WARN] Transcript archive unavailable: {e}")
+        self.scrollbar.valueChanged.connect(self._on_scroll)
+
+    @staticmethod
+    def turn_html(role, text):
+        if role == "user":
+            return f"<p style='color:#00ffff; font-weight:bold;'>&gt; USER:</p><p style='color:#e0e0ff; padding-left: 10px;'>{escape(text)}</p>"
+        return f"<p style='color:#00d1ff; font-weight:bold;'>&gt; A.D.A.:</p><p style='color:#e0e0ff;'>{escape(text).replace(chr(10), '<br>')}</p><p></p>"
+
+    def at_bottom(self):
+        return self.scrollbar.value() >= self.scrollbar.maximum() - 4
+
+    def _start_turn(self, role, html):
+        first_block = 0 if self.document.isEmpty() else self.document.blockCount()
+        self.text_edit.append(html)
+        turn = {"id": self.next_id, "role": role, "text": "", "archived": False,
+                "start": QTextCursor(self.document.findBlockByNumber(first_block))}
+        self.next_id += 1
+        self.turns.append(turn)
+        return turn
+
+    def add_user_text(self, text):
+        self.flush()
+        follow = self.at_bottom()
+        self._start_turn("user", self.turn_html("user", text))["text"] = text
+        self.current = None
+        if follow: self._scroll_to_end()
+
+    def add_chunk(self, text):
+        self.pending.append(text)
+        if not self.flush_timer.isActive(): self.flush_timer.start()
+
+    def flush(self):
+        """Inserts everything buffered since the last tick in one edit."""
+        self.flush_timer.stop()
+        if not self.pending: return
+        text, self.pending = "".join(self.pending), []
+        follow = self.at_bottom()
+        if self.current is None:
+            self.current = self._start_turn("ada", "<p style='color:#00d1ff; font-weight:bold;'>&gt; A.D.A.:</p>")
+        cursor = QTextCursor(self.document)
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.current["text"] += text
+        if follow: self._scroll_to_end()
+
+    def end_turn(self):
+        self.flush()
+        if self.current is not None: self.text_edit.append("")
+        self.current = None
+
+    def _scroll_to_end(self):
+        # Trimming only happens while following new text, so paged-in history isn't pulled away mid-read
+        self._trim()
+        self.scrollbar.setValue(self.scrollbar.maximum())
+
+    def _trim(self):
+        """Archives and removes the oldest turns while the document is over its block budget."""
+        while self.document.blockCount() > TRANSCRIPT_MAX_BLOCKS and len(self.turns) > 1 and self.turns[0] is not self.current:
+            oldest = self.turns.popleft()
+            if not oldest["archived"]: self._archive(oldest)
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(self.turns[0]["start"].position(), QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+
+    def _archive(self, turn):
+        if self.archive_path is None: return
+        try:
+            with open(self.archive_path, "a", encoding="utf-8") as f:
+                offset = f.tell()
+                f.write(json.dumps({"id": turn["id"], "role": turn["role"], "text": turn["text"]}) + "\n")
+        except OSError as e:
+            print(f">>> [WARN] Could not archive transcript: {e}")
+            return
+        # Turns are archived oldest first, so ids and offsets stay aligned
+        if turn["id"] == len(self.archive_offsets): self.archive_offsets.append(offset)
+
+    def _on_scroll(self, value):
+        if value == self.scrollbar.minimum() and self.turns and 0 < self.turns[0]["id"] <= len(self.archive_offsets):
+            QTimer.singleShot(0, self.page_in)
+
+    def page_in(self):
+        """Reads the archived turns just before the oldest displayed one back into the top of the view."""
+        if not self.turns or self.turns[0]["id"] == 0 or self.turns[0]["id"] > len(self.archive_offsets): return
+        last = self.turns[0]["id"]
+        first = max(0, last - TRANSCRIPT_PAGE_TURNS)
+        try:
+            with open(self.archive_path, "r", encoding="utf-8") as f:
+                f.seek(self.archive_offsets[first])
+                page = [json.loads(f.readline()) for _ in range(last - first)]
+        except (OSError, ValueError) as e:
+            print(f">>> [WARN] Could not read transcript archive: {e}")
+            return
+        from_bottom = self.scrollbar.maximum() - self.scrollbar.value()
+        for entry in reversed(page):
+            cursor = QTextCursor(self.document)
+            cursor.movePosition(QTextCursor.Start)
+            cursor.insertBlock()
+            cursor.movePosition(QTextCursor.Start)
+            cursor.insertHtml(self.turn_html(entry["role"], entry["text"]))
+            start = QTextCursor(self.document)
+            start.movePosition(QTextCursor.Start)
+            self.turns.appendleft({"id": entry["id"], "role": entry["role"], "text": entry["text"], "start": start, "archived": True})
+        # Keep the text the user was looking at in place
+        self.scrollbar.setValue(self.scrollbar.maximum() - from_bottom)
+
 class MainWindow(QMainWindow):
     user_text_submitted = Signal(str)
 
@@ -1254,16 +3621,18 @@ class MainWindow(QMainWindow):
         self.main_layout.addWidget(self.left_panel, 2)
         self.main_layout.addWidget(self.middle_panel, 5)
         self.main_layout.addWidget(self.right_panel, 3)
-        self.is_first_ada_chunk = True
+        self.transcript = TranscriptView(self.text_display)
         self.current_video_mode = DEFAULT_MODE
         self.setup_backend_thread()
 
     def setup_backend_thread(self):
         parser = argparse.ArgumentParser()
         parser.add_argument("--mode", type=str, default=DEFAULT_MODE, help="pixels to stream from", choices=["camera", "screen", "none"])
+        parser.add_argument("--screen-region", type=str, default=DEFAULT_SCREEN_REGION,
+                            help="screen mode capture region: all, monitor:<n>, window:<title> or rect:<left>,<top>,<width>,<height>")
         args, unknown = parser.parse_known_args()
         
-        self.ai_core = AI_Core(video_mode=args.mode)
+        self.ai_core = AI_Core(video_mode=args.mode, screen_region=args.screen_region)
         
         self.user_text_submitted.connect(self.ai_core.handle_user_text)
         self.webcam_button.clicked.connect(lambda: self.ai_core.set_video_mode("camera"))
@@ -1292,6 +3661,18 @@ class MainWindow(QMainWindow):
         self.backend_thread.start()
         
         self.update_video_mode_ui(self.ai_core.video_mode)
+        self.video_container.installEventFilter(self)
+        self.push_display_size()
+
+    def eventFilter(self, obj, event):
+        if obj is self.video_container and event.type() == QEvent.Type.Resize: self.push_display_size()
+        return super().eventFilter(obj, event)
+
+    def push_display_size(self):
+        """Tells the capture thread what size to pre-scale preview frames to."""
+        ratio = self.video_container.devicePixelRatioF()
+        size = self.video_container.size()
+        self.ai_core.set_display_size(int(size.width() * ratio), int(size.height() * ratio))
 
     @Slot(str, str)
     def show_system_alert(self, level, message):
@@ -1310,7 +3691,7 @@ class MainWindow(QMainWindow):
     def send_user_text(self):
         text = self.input_box.text().strip()
         if text:
-            self.text_display.append(f"<p style='color:#00ffff; font-weight:bold;'>&gt; USER:</p><p style='color:#e0e0ff; padding-left: 10px;'>{escape(text)}</p>")
+            self.transcript.add_user_text(text)
             self.user_text_submitted.emit(text)
             self.input_box.clear()
 
@@ -1335,13 +3716,7 @@ class MainWindow(QMainWindow):
 
     @Slot(str)
     def update_text(self, text):
-        if self.is_first_ada_chunk:
-            self.is_first_ada_chunk = False
-            self.text_display.append(f"<p style='color:#00d1ff; font-weight:bold;'>&gt; A.D.A.:</p>")
-        cursor = self.text_display.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        cursor.insertText(text)
-        self.text_display.verticalScrollBar().setValue(self.text_display.verticalScrollBar().maximum())
+        self.transcript.add_chunk(text)
 
     @Slot(list)
     def update_search_results(self, urls):
@@ -1395,22 +3770,25 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def add_newline(self):
-        if not self.is_first_ada_chunk: self.text_display.append("")
-        self.is_first_ada_chunk = True
+        self.transcript.end_turn()
 
-    @Slot(QImage)
-    def update_frame(self, image):
-        if self.current_video_mode == "none":
-            if self.video_label.pixmap():
+    @Slot(QImage, int)
+    def update_frame(self, image, token):
+        # Frames arrive already scaled to the container, so this is a single upload and blit
+        try:
+            if self.current_video_mode == "none":
+                if self.video_label.pixmap():
+                    self.video_label.clear()
+                return
+
+            if not image.isNull():
+                pixmap = QPixmap.fromImage(image)
+                pixmap.setDevicePixelRatio(self.video_container.devicePixelRatioF())
+                self.video_label.setPixmap(pixmap)
+            else:
                 self.video_label.clear()
-            return
-
-        if not image.isNull():
-            pixmap = QPixmap.fromImage(image)
-            scaled_pixmap = pixmap.scaled(self.video_container.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.video_label.setPixmap(scaled_pixmap)
-        else:
-            self.video_label.clear()
+        finally:
+            self.ai_core.release_frame(token)
 
     def update_clock(self):
         """Update the real-time clock display"""
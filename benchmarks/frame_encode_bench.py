@@ -0,0 +1,69 @@
+"""
+Compares the old and new outbound frame encode paths at 1080p and 4K.
+
+Old: BGR->RGB cvtColor, PIL.Image.fromarray, thumbnail, JPEG save to BytesIO.
+New: ada.FrameEncoder (cv2.resize INTER_AREA + cv2.imencode, or TurboJPEG if installed).
+
+Both paths are timed up to the JPEG bytes. The base64 step is left out of both:
+the old code did it by hand and the SDK now does it on send, so it costs the same.
+
+Run from the repository root:  python benchmarks/frame_encode_bench.py
+"""
+import io
+import os
+import sys
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("ELEVENLABS_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import PIL.Image
+
+import ada
+
+RESOLUTIONS = {"1080p": (1080, 1920), "4K": (2160, 3840)}
+ITERATIONS = 30
+
+
+def make_frame(height, width):
+    """A desktop-like frame: flat panels, gradients and some text-like noise."""
+    rng = np.random.default_rng(0)
+    frame = np.full((height, width, 3), 235, dtype=np.uint8)
+    frame[:, : width // 5] = (40, 44, 52)
+    frame[: height // 12] = np.linspace(60, 200, width, dtype=np.uint8)[None, :, None]
+    for y in range(height // 8, height, 24):
+        cv2.putText(frame, "def handler(request): return process(request.payload)", (width // 4, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20, 20, 20), 1, cv2.LINE_AA)
+    frame[height // 2:, width // 2:] = rng.integers(0, 255, (height - height // 2, width - width // 2, 3), dtype=np.uint8)
+    return frame
+
+
+def old_path(frame):
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    pil_img = PIL.Image.fromarray(frame_rgb)
+    pil_img.thumbnail([1024, 1024])
+    image_io = io.BytesIO()
+    pil_img.save(image_io, format="jpeg")
+    return image_io.getvalue()
+
+
+def time_it(func, frame):
+    func(frame)  # Warm-up
+    started = time.perf_counter()
+    for _ in range(ITERATIONS): result = func(frame)
+    return (time.perf_counter() - started) / ITERATIONS * 1000, len(result)
+
+
+if __name__ == "__main__":
+    encoder = ada.FrameEncoder()
+    print(f"New path backend: {encoder.stats()['backend']}, {ITERATIONS} iterations each")
+    print(f"{'resolution':<12}{'old ms':>10}{'new ms':>10}{'speedup':>10}{'old JPEG KB':>14}{'new JPEG KB':>14}")
+    for name, (height, width) in RESOLUTIONS.items():
+        frame = make_frame(height, width)
+        old_ms, old_size = time_it(old_path, frame)
+        new_ms, new_size = time_it(encoder.encode, frame)
+        print(f"{name:<12}{old_ms:>10.2f}{new_ms:>10.2f}{old_ms / new_ms:>9.1f}x{old_size / 1024:>14.1f}{new_size / 1024:>14.1f}")
+    encoder.shutdown()